@@ -0,0 +1,340 @@
+"""
+Benchmarks for the wallpaper rendering pipeline.
+
+    python benchmark.py decode [--repeats 3] [--json results.json]
+    python benchmark.py fit [--repeats 3] [--json results.json]
+    python benchmark.py pipeline [--layouts dual_mixed,six_wall] [--workers 1] [--repeats 3] [--json results.json]
+
+Every case runs in a fresh interpreter so peak RSS belongs to that case alone.
+The pipeline benchmark runs headless on any OS through the fake platform backend.
+"""
+import os
+import sys
+import json
+import math
+import argparse
+import statistics
+import subprocess
+import tempfile
+import time
+from PIL import Image, ImageChops
+from metrics import peak_rss_kb
+
+# Typical camera sources: 24 MP and 50 MP
+SOURCE_SIZES = [(6000, 4000), (8688, 5792)]
+TARGET_SIZES = [(1920, 1080), (2560, 1440), (3840, 2160)]
+
+
+def make_synthetic_image(path, size, fmt="JPEG", mode="RGB"):
+    """
+    Gradients plus noise: compresses like a photo instead of a flat colour or pure noise.
+    mode 'P' (palette), '1' (bilevel) or 'I;16' (16-bit grayscale) covers the sources
+    that need converting before they can be reduced.
+    """
+    red = Image.linear_gradient('L').resize(size)
+    green = Image.radial_gradient('L').resize(size)
+    blue = Image.effect_noise(size, 40)
+    img = Image.merge('RGB', (red, green, blue))
+    if mode == "P":
+        img = img.quantize(256)
+    elif mode == "1":
+        img = img.convert('1')
+    elif mode == "I;16":
+        img = img.convert('L').convert('I').point(lambda v: v * 257).convert('I;16')
+    options = {'quality': 90} if fmt == "JPEG" else {}
+    img.save(path, fmt, **options)
+    return path
+
+
+def check_renders(path):
+    """Fails the run if a source renders flat (blank or saturated): it is a gradient, so the tile can't be."""
+    from tile_renderer import render_tile
+    for reduce in (False, True):
+        tile = render_tile(path, 640, 360, reduce=reduce)
+        if all(low == high for low, high in tile.getextrema()):
+            raise SystemExit(f"{os.path.basename(path)} renders as a flat tile {tile.getextrema()} "
+                             f"(reduce={reduce})")
+
+
+def psnr(a, b):
+    """Peak signal-to-noise ratio between two same-sized RGB images, in dB."""
+    histogram = ImageChops.difference(a, b).histogram()
+    squares = sum(count * ((i % 256) ** 2) for i, count in enumerate(histogram))
+    mse = squares / float(a.width * a.height * 3)
+    return float('inf') if mse == 0 else 20 * math.log10(255.0 / math.sqrt(mse))
+
+
+# name -> monitors as (x, y, width, height); negative offsets as Windows reports them
+# for displays left of / above the primary one
+LAYOUTS = {
+    'single_1080p': [(0, 0, 1920, 1080)],
+    'dual_mixed': [(0, 0, 2560, 1440), (2560, 180, 1920, 1080)],
+    'triple_portrait': [(-1080, -420, 1080, 1920), (0, 0, 2560, 1440), (2560, -420, 1080, 1920)],
+    'sparse_vertical': [(0, 0, 1920, 1080), (1920, 2160, 3840, 2160)],
+    'quad_grid': [(-1920, -1080, 1920, 1080), (0, -1080, 1920, 1080),
+                  (-1920, 0, 1920, 1080), (0, 0, 1920, 1080)],
+    'five_mixed': [(-2160, -600, 2160, 3840), (0, 0, 3840, 2160), (3840, 0, 2560, 1440),
+                   (3840, 1440, 2560, 1440), (0, 2160, 1920, 1080)],
+    'six_wall': [(x * 3840, y * 2160, 3840, 2160) for y in range(2) for x in range(3)],
+}
+
+# Aspect mismatches for the cover fit: (source, target); ultrawide onto portrait and back
+FIT_CASES = [
+    ((5120, 1440), (1080, 1920)), ((5120, 1440), (3840, 2160)), ((6000, 4000), (3440, 1440)),
+    ((4000, 6000), (3840, 2160)), ((1280, 720), (1080, 1920)),
+]
+
+# Synthetic sources: (width, height, format[, mode]), camera-sized down to smaller-than-screen
+PIPELINE_SOURCES = [
+    (6000, 4000, "JPEG"), (4000, 6000, "JPEG"), (3000, 2000, "PNG"),
+    (1280, 720, "JPEG"), (5120, 2880, "WEBP"), (2400, 1600, "BMP"),
+    (4000, 3000, "PNG", "P"), (4000, 3000, "PNG", "1"), (4000, 3000, "PNG", "I;16"),
+]
+
+
+def _run_case(argv):
+    """Runs one case in a child interpreter and returns its JSON result."""
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__)] + argv)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def decode_case(path, width, height, reduce, repeats):
+    from tile_renderer import render_tile
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        render_tile(path, width, height, reduce=reduce)
+        timings.append(time.perf_counter() - start)
+    return {'seconds': statistics.median(timings), 'peak_rss_kb': peak_rss_kb()}
+
+
+def bench_decode(args, workdir):
+    """Full-resolution decode + LANCZOS vs draft/reduce-on-load + LANCZOS."""
+    from tile_renderer import render_tile
+    results = []
+    for source_size in SOURCE_SIZES:
+        for fmt in ("JPEG", "PNG"):
+            path = os.path.join(workdir, f"source_{source_size[0]}x{source_size[1]}.{fmt.lower()}")
+            make_synthetic_image(path, source_size, fmt)
+            for width, height in TARGET_SIZES:
+                case = {'source': list(source_size), 'format': fmt, 'target': [width, height]}
+                for reduce in (False, True):
+                    run = _run_case(["_decode-case", path, str(width), str(height),
+                                     "1" if reduce else "0", str(args.repeats)])
+                    case['reduced' if reduce else 'full'] = run
+                case['speedup'] = round(case['full']['seconds'] / case['reduced']['seconds'], 2)
+                case['psnr_db'] = round(psnr(
+                    render_tile(path, width, height, reduce=False),
+                    render_tile(path, width, height, reduce=True)
+                ), 2)
+                results.append(case)
+                print(f"{fmt:4} {source_size[0]}x{source_size[1]} -> {width}x{height}: "
+                      f"full {case['full']['seconds']:.3f}s / {case['full']['peak_rss_kb']} KiB, "
+                      f"reduced {case['reduced']['seconds']:.3f}s / {case['reduced']['peak_rss_kb']} KiB, "
+                      f"x{case['speedup']}, PSNR {case['psnr_db']} dB", file=sys.stderr)
+    return results
+
+
+def _median_seconds(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def bench_fit(args, workdir):
+    """Cover fit: resize-then-crop vs resizing only the crop box; PIL vs NumPy compositing."""
+    from tile_renderer import fit_cover, fit_cover_full
+    from compositor import create_canvas, COMPOSITOR_PIL, COMPOSITOR_NUMPY, np
+    results = []
+    for source_size, (width, height) in FIT_CASES:
+        source = make_synthetic_image(os.path.join(workdir, "fit.bmp"), source_size, "BMP")
+        with Image.open(source) as img:
+            img.load()
+            full = _median_seconds(lambda: fit_cover_full(img, width, height), args.repeats)
+            box = _median_seconds(lambda: fit_cover(img, width, height), args.repeats)
+            quality = psnr(fit_cover_full(img, width, height), fit_cover(img, width, height))
+        case = {
+            'source': list(source_size), 'target': [width, height],
+            'full_seconds': round(full, 4), 'box_seconds': round(box, 4),
+            'speedup': round(full / box, 2), 'psnr_db': round(quality, 2)
+        }
+        results.append(case)
+        print(f"fit {source_size[0]}x{source_size[1]} -> {width}x{height}: "
+              f"resize+crop {full:.3f}s, box {box:.3f}s, x{case['speedup']}, PSNR {case['psnr_db']} dB",
+              file=sys.stderr)
+
+    compositors = [COMPOSITOR_PIL] + ([COMPOSITOR_NUMPY] if np is not None else [])
+    for layout in ('dual_mixed', 'six_wall'):
+        monitors = LAYOUTS[layout]
+        min_x = min(m[0] for m in monitors)
+        min_y = min(m[1] for m in monitors)
+        size = (max(m[0] + m[2] for m in monitors) - min_x, max(m[1] + m[3] for m in monitors) - min_y)
+        tiles = [(Image.new('RGB', (m[2], m[3]), (i * 40, 80, 160)), (m[0] - min_x, m[1] - min_y))
+                 for i, m in enumerate(monitors)]
+        case = {'layout': layout, 'canvas': list(size)}
+        for compositor in compositors:
+            def compose():
+                canvas = create_canvas(size, compositor)
+                for tile, xy in tiles:
+                    canvas.paste(tile, xy)
+                canvas.image()
+            case[f'{compositor}_seconds'] = round(_median_seconds(compose, args.repeats), 4)
+        results.append(case)
+        print(f"compose {layout}: " + ", ".join(
+            f"{c} {case[f'{c}_seconds']:.3f}s" for c in compositors), file=sys.stderr)
+    return results
+
+
+def pipeline_case(spec):
+    """One layout in a fresh service: cold render, warm rotations and encoder timings."""
+    os.chdir(spec['workdir'])
+    with open("monitor_config.json", 'w', encoding='utf-8') as f:
+        json.dump({'app_settings': {
+            'show_logs': False, 'watch_files': False, 'output_format': spec['format'],
+            'render_workers': spec['workers'], 'tile_cache_mb': spec['tile_cache_mb'],
+            'render_band_mb': spec['band_mb'], 'compositor': spec['compositor'],
+        }}, f)
+
+    import logging
+    logging.disable(logging.INFO)
+    from platform_backend import FakeBackend
+    from wallpaper_service import WallpaperService
+    from wallpaper_encoder import measure_encoders
+    from rotation_engine import RotationEngine, NullWallpaperSetter
+
+    service = WallpaperService(FakeBackend(LAYOUTS[spec['layout']]))
+    engine = RotationEngine(service, NullWallpaperSetter())
+    images = spec['images']
+    names = [m['name'] for m in service.monitors]
+
+    def images_map(step):
+        return {name: images[(step + i) % len(images)] for i, name in enumerate(names)}
+
+    def rotate(step):
+        engine.current_wallpapers = images_map(step)
+        start = time.perf_counter()
+        engine.apply_current()
+        return time.perf_counter() - start
+
+    cold = rotate(0)
+    unchanged = rotate(0)
+    # First cycle fills the tile cache, the following ones only repaint and encode
+    first_cycle = [rotate(step) for step in range(1, len(images))]
+    warm = [rotate(step) for _ in range(spec['repeats']) for step in range(len(images))]
+
+    result = {
+        'canvas': None,
+        'cold_seconds': round(cold, 4),
+        'unchanged_seconds': round(unchanged, 4),
+        'first_cycle_median_seconds': round(statistics.median(first_cycle), 4) if first_cycle else None,
+        'warm_median_seconds': round(statistics.median(warm), 4),
+        'warm_p90_seconds': round(sorted(warm)[int(0.9 * (len(warm) - 1))], 4),
+    }
+    stats = service.get_stats()
+    result['stages_p50_ms'] = {
+        stage: summary['p50_ms'] for stage, summary in stats['stages'].items() if summary['count']
+    }
+    result['tile_cache'] = stats['tile_cache']
+    if service._canvas is not None:
+        result['canvas'] = list(service._canvas.size)
+        result['encoders'] = measure_encoders(service._canvas.image(), service.get_app_settings())
+    result['peak_rss_kb'] = peak_rss_kb()
+    return result
+
+
+def bench_pipeline(args, workdir):
+    """Stitch + encode over synthetic monitor layouts, cold and warm."""
+    images = []
+    for width, height, fmt, *mode in PIPELINE_SOURCES:
+        mode = mode[0] if mode else "RGB"
+        suffix = "" if mode == "RGB" else "_" + mode.replace(";", "")
+        path = os.path.join(workdir, f"source_{width}x{height}{suffix}.{fmt.lower()}")
+        make_synthetic_image(path, (width, height), fmt, mode)
+        check_renders(path)
+        images.append(path)
+
+    layouts = args.layouts.split(",") if args.layouts else list(LAYOUTS)
+    results = []
+    for layout in layouts:
+        if layout not in LAYOUTS:
+            raise SystemExit(f"Unknown layout {layout!r}; choose from {', '.join(LAYOUTS)}")
+        case_dir = os.path.join(workdir, layout)
+        os.makedirs(case_dir, exist_ok=True)
+        spec = {
+            'layout': layout, 'workdir': case_dir, 'images': images, 'repeats': args.repeats,
+            'workers': args.workers, 'format': args.format, 'tile_cache_mb': args.tile_cache_mb,
+            'band_mb': args.band_mb, 'compositor': args.compositor,
+        }
+        case = {'layout': layout, 'monitors': len(LAYOUTS[layout]), 'workers': args.workers,
+                'format': args.format, 'band_mb': args.band_mb, 'compositor': args.compositor}
+        case.update(_run_case(["_pipeline-case", json.dumps(spec)]))
+        results.append(case)
+        print(f"{layout:16} {case['monitors']} monitors {case['canvas']}: "
+              f"cold {case['cold_seconds']:.3f}s, warm {case['warm_median_seconds']:.3f}s, "
+              f"unchanged {case['unchanged_seconds']:.3f}s, peak {case['peak_rss_kb']} KiB", file=sys.stderr)
+    return results
+
+
+def _git_commit():
+    """Current commit, so result files from different revisions can be told apart."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+BENCHMARKS = {
+    'decode': bench_decode,
+    'fit': bench_fit,
+    'pipeline': bench_pipeline,
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "_decode-case":
+        path, width, height, reduce, repeats = argv[1:6]
+        print(json.dumps(decode_case(path, int(width), int(height), reduce == "1", int(repeats))))
+        return 0
+    if argv and argv[0] == "_pipeline-case":
+        print(json.dumps(pipeline_case(json.loads(argv[1]))))
+        return 0
+
+    parser = argparse.ArgumentParser(description="Dynamic Screen BG rendering benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--repeats", type=int, default=3, help="runs per case (median is reported)")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    parser.add_argument("--layouts", help=f"pipeline: comma-separated subset of {', '.join(LAYOUTS)}")
+    parser.add_argument("--workers", type=int, default=1, help="pipeline: render worker processes")
+    parser.add_argument("--format", default="bmp", choices=["bmp", "jpeg", "png", "auto"],
+                        help="pipeline: output format")
+    parser.add_argument("--tile-cache-mb", type=int, default=256, help="pipeline: tile cache budget")
+    parser.add_argument("--band-mb", type=int, default=0,
+                        help="pipeline: render in row bands of at most this size (0 = full canvas)")
+    parser.add_argument("--compositor", default="pil", choices=["pil", "numpy"],
+                        help="pipeline: canvas backend (numpy needs NumPy installed)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="dsbg_bench_") as workdir:
+        results = BENCHMARKS[args.benchmark](args, workdir)
+
+    report = {
+        'benchmark': args.benchmark, 'python': sys.version.split()[0],
+        'commit': _git_commit(), 'cpu_count': os.cpu_count(), 'results': results
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
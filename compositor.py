@@ -0,0 +1,63 @@
+import logging
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# NumPy is optional; without it only the PIL compositor is available
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+COMPOSITOR_PIL = "pil"
+COMPOSITOR_NUMPY = "numpy"
+
+
+class PilCanvas:
+    """The composite as a PIL image; tiles are pasted with Image.paste."""
+
+    def __init__(self, size):
+        self.size = size
+        self._image = Image.new('RGB', size, (0, 0, 0))
+
+    def paste(self, tile, xy):
+        self._image.paste(tile, xy)
+
+    def clear(self, box):
+        self._image.paste((0, 0, 0), box)
+
+    def image(self):
+        """The composite as a PIL image, for encoding."""
+        return self._image
+
+
+class NumpyCanvas:
+    """
+    The composite as one preallocated height x width x 3 uint8 array. Tiles land as
+    slice assignments and regions are cleared by zeroing a slice; the PIL image is
+    only built when the composite is encoded.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._buffer = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+
+    def paste(self, tile, xy):
+        x, y = xy
+        self._buffer[y:y + tile.height, x:x + tile.width] = np.asarray(tile)
+
+    def clear(self, box):
+        left, top, right, bottom = box
+        self._buffer[top:bottom, left:right] = 0
+
+    def image(self):
+        return Image.fromarray(self._buffer, 'RGB')
+
+
+def create_canvas(size, compositor=COMPOSITOR_PIL):
+    """Black canvas of the given size for the configured compositor ('pil' or 'numpy')."""
+    if compositor == COMPOSITOR_NUMPY:
+        if np is not None:
+            return NumpyCanvas(size)
+        logger.warning("NumPy is not installed, compositing with PIL")
+    return PilCanvas(size)
@@ -0,0 +1,306 @@
+import os
+import bisect
+import fnmatch
+import logging
+import threading
+from collections.abc import Sequence
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PATTERNS = ["*.jpg", "*.jpeg", "*.png", "*.bmp", "*.webp", "*.gif", "*.tif", "*.tiff"]
+
+
+class _DirEntry:
+    __slots__ = ('mtime_ns', 'files', 'subdirs')
+
+    def __init__(self, mtime_ns, files, subdirs):
+        self.mtime_ns = mtime_ns
+        self.files = files        # {name: (size, mtime_ns)}
+        self.subdirs = subdirs    # tuple of subdirectory paths
+
+
+class FolderScanner:
+    """
+    Incremental index of the images under each monitor's source folders.
+
+    Every directory is remembered with its mtime. A refresh stats each directory once
+    and only lists (and stats the files of) directories whose mtime changed, so
+    re-checking a 100k-file tree costs one stat per directory. Results are published
+    per monitor as an immutable sorted tuple that readers use without copying.
+    """
+
+    def __init__(self, refresh_interval=300, on_change=None):
+        self.refresh_interval = refresh_interval
+        self.on_change = on_change    # on_change(monitor_name) after its file set changed
+
+        self._sources = {}            # monitor -> list of {'path', 'recursive', 'patterns'}
+        self._dirs = {}               # directory path -> _DirEntry
+        self._files = {}              # monitor -> tuple of paths
+        self._built = {}              # monitor -> (generation, folders) its tuple was built from
+        self._generation = 0          # bumped whenever any directory or file entry changes
+        self._updates = set()         # paths from update_file, applied on the scanner thread
+        self._rescan = False          # request_refresh() asked for a full walk
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def set_sources(self, monitor, folders):
+        with self._lock:
+            if folders:
+                self._sources[monitor] = [dict(f) for f in folders]
+            else:
+                self._sources.pop(monitor, None)
+                self._files.pop(monitor, None)
+                self._built.pop(monitor, None)
+        if folders:
+            self.start()
+        self.request_refresh()
+
+    def files(self, monitor):
+        """Current images of a monitor's folders (immutable, safe to hold on to)."""
+        return self._files.get(monitor, ())
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True, name="folder-scanner")
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def request_refresh(self):
+        self._rescan = True
+        self._wake.set()
+
+    def refresh(self):
+        """Brings every monitor's file set up to date. Returns the monitors that changed."""
+        with self._lock:
+            self._rescan = False
+            sources = {monitor: list(folders) for monitor, folders in self._sources.items()}
+            updates, self._updates = self._updates, set()
+        # Directory entries are only ever touched on the scanner thread
+        for path in updates:
+            self._restat_file(path)
+        return self._rebuild(sources, self._walk)
+
+    def apply_updates(self):
+        """
+        Applies the files queued by update_file without walking any folder: only the
+        monitors whose sources contain them are rebuilt, from the cached directory
+        entries. Returns the monitors that changed.
+        """
+        with self._lock:
+            sources = {monitor: list(folders) for monitor, folders in self._sources.items()}
+            updates, self._updates = self._updates, set()
+        for path in updates:
+            self._restat_file(path)
+        affected = {
+            monitor: folders for monitor, folders in sources.items()
+            if any(_covers(folder, path) for folder in folders for path in updates)
+        }
+        return self._rebuild(affected, self._known_dirs)
+
+    def _rebuild(self, sources, walk):
+        changed = []
+        for monitor, folders in sources.items():
+            directories = [
+                (folder, list(walk(folder['path'], folder.get('recursive', True))))
+                for folder in folders
+            ]
+            if self._built.get(monitor) == (self._generation, folders):
+                # Nothing was rescanned since this monitor's list was last built
+                continue
+
+            paths = []
+            for folder, folder_dirs in directories:
+                patterns = [p.lower() for p in folder.get('patterns') or IMAGE_PATTERNS]
+                for directory in folder_dirs:
+                    entry = self._dirs.get(directory)
+                    if entry is None:
+                        continue
+                    for name in entry.files:
+                        lower = name.lower()
+                        if any(fnmatch.fnmatchcase(lower, p) for p in patterns):
+                            paths.append(os.path.join(directory, name))
+            self._built[monitor] = (self._generation, folders)
+            files = tuple(sorted(set(paths)))
+            if files != self._files.get(monitor, ()):
+                self._files[monitor] = files
+                changed.append(monitor)
+
+        for monitor in changed:
+            logger.info(f"Folder scan: {len(self._files[monitor])} images for {monitor}")
+            if self.on_change:
+                try:
+                    self.on_change(monitor)
+                except Exception as e:
+                    logger.error(f"Folder scan callback error: {e}")
+        return changed
+
+    def update_file(self, path):
+        """
+        Re-stats a single file (e.g. on a watcher event) without rescanning its directory.
+        Safe from any thread: the file is queued for the scanner thread. Files outside
+        every folder source are ignored.
+        """
+        path = os.path.normpath(path)
+        with self._lock:
+            if not any(_covers(folder, path) for folders in self._sources.values() for folder in folders):
+                return
+            self._updates.add(path)
+        self._wake.set()
+
+    def _restat_file(self, path):
+        directory, name = os.path.split(path)
+        entry = self._dirs.get(directory)
+        if entry is None:
+            # In a directory created since it was last scanned: list it and every new one above it
+            new_dirs = []
+            while directory not in self._dirs:
+                parent = os.path.dirname(directory)
+                if parent == directory:
+                    return
+                new_dirs.append(directory)
+                directory = parent
+            for directory in [directory] + new_dirs[::-1]:
+                self._scan_dir(directory)
+            return
+        try:
+            st = os.stat(path)
+            entry.files[name] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            entry.files.pop(name, None)
+        self._generation += 1
+
+    def _walk(self, root, recursive):
+        """Yields directories under root, rescanning only those whose mtime changed."""
+        stack = [os.path.normpath(root)]
+        while stack:
+            directory = stack.pop()
+            entry = self._scan_dir(directory)
+            if entry is None:
+                continue
+            yield directory
+            if recursive:
+                stack.extend(entry.subdirs)
+
+    def _known_dirs(self, root, recursive):
+        """Like _walk, but only from the cached directory entries, without a stat."""
+        stack = [os.path.normpath(root)]
+        while stack:
+            directory = stack.pop()
+            entry = self._dirs.get(directory)
+            if entry is None:
+                continue
+            yield directory
+            if recursive:
+                stack.extend(entry.subdirs)
+
+    def _scan_dir(self, directory):
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            if self._dirs.pop(directory, None) is not None:
+                self._generation += 1
+            return None
+
+        entry = self._dirs.get(directory)
+        if entry is not None and entry.mtime_ns == mtime_ns:
+            return entry
+
+        files = {}
+        subdirs = []
+        try:
+            with os.scandir(directory) as it:
+                for item in it:
+                    try:
+                        if item.is_dir(follow_symlinks=False):
+                            subdirs.append(item.path)
+                        elif item.is_file():
+                            st = item.stat()
+                            files[item.name] = (st.st_size, st.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.error(f"Folder scan error in {directory}: {e}")
+            return None
+
+        entry = _DirEntry(mtime_ns, files, tuple(subdirs))
+        self._dirs[directory] = entry
+        self._generation += 1
+        return entry
+
+    def _run(self):
+        rescan = True
+        while not self._stopped:
+            try:
+                if rescan:
+                    self.refresh()
+                else:
+                    self.apply_updates()
+            except Exception as e:
+                logger.error(f"Folder scan error: {e}")
+            # Woken only by update_file: apply the queued files, no walk
+            woken = self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+            rescan = not woken or self._rescan
+
+
+def _covers(folder, path):
+    """True if path is a file directly in the folder source (or below it, when recursive)."""
+    root = os.path.normpath(folder['path'])
+    directory = os.path.dirname(path)
+    return directory == root or (folder.get('recursive', True) and directory.startswith(root + os.sep))
+
+
+class CombinedPlaylist(Sequence):
+    """Explicit images followed by folder images, without concatenating them."""
+
+    def __init__(self, images, folder_files):
+        self.images = images
+        self.folder_files = folder_files
+
+    def __len__(self):
+        return len(self.images) + len(self.folder_files)
+
+    def walk(self, cursor=None, include=False):
+        """
+        Every item once as (cursor, path), like Playlist.walk. Explicit images are
+        addressed by their store position, folder files by their path (the folder
+        list is sorted, so it is found by bisection).
+        """
+        files = self.folder_files
+        if isinstance(cursor, str):
+            start = (bisect.bisect_left if include else bisect.bisect_right)(files, cursor)
+            for i in range(start, len(files)):
+                yield files[i], files[i]
+            yield from self.images.walk()
+            for i in range(start):
+                yield files[i], files[i]
+            return
+        yield from self.images.items(cursor, include) if cursor is not None else self.images.items()
+        for path in files:
+            yield path, path
+        if cursor is not None:
+            for position, path in self.images.items():
+                if position > cursor or (include and position == cursor):
+                    return
+                yield position, path
+
+    def cursor_at(self, index):
+        count = len(self.images)
+        return self.images.cursor_at(index) if index < count else self.folder_files[index - count]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        count = len(self.images)
+        if index < 0:
+            index += len(self)
+        if index < count:
+            return self.images[index]
+        return self.folder_files[index - count]
@@ -0,0 +1,276 @@
+import os
+import sys
+import struct
+import select
+import ctypes
+import ctypes.util
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Event kinds passed to on_events as (kind, path, new_path)
+CREATED = "created"
+DELETED = "deleted"
+MODIFIED = "modified"
+MOVED = "moved"
+
+
+class PollingWatcher:
+    """
+    Portable fallback: every poll_interval seconds it re-stats the watched files and
+    lists the watched directories, then reports the differences as events.
+    """
+
+    def __init__(self, on_events, poll_interval=30):
+        self.on_events = on_events
+        self.poll_interval = poll_interval
+        self._dirs = {}        # directory -> recursive flag
+        self._files = set()    # individually watched files
+        self._snapshot = {}    # path -> (size, mtime_ns)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def watch_dir(self, path, recursive=True):
+        with self._lock:
+            self._dirs[os.path.normpath(path)] = recursive
+
+    def unwatch_dir(self, path):
+        with self._lock:
+            self._dirs.pop(os.path.normpath(path), None)
+
+    def watch_files(self, paths):
+        with self._lock:
+            self._files.update(os.path.normpath(p) for p in paths)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped = False
+        # Baseline first, so files that already exist are not reported as created
+        self._snapshot = self._take_snapshot()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="fs-watcher")
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def poll(self):
+        """Compares the file system against the last snapshot and dispatches the changes."""
+        current = self._take_snapshot()
+        previous = self._snapshot
+        self._snapshot = current
+
+        events = []
+        for path, stat in current.items():
+            old = previous.get(path)
+            if old is None:
+                events.append((CREATED, path, None))
+            elif old != stat:
+                events.append((MODIFIED, path, None))
+        for path in previous:
+            # A whole missing parent usually means an unplugged drive, not deleted photos
+            if path not in current and os.path.isdir(os.path.dirname(path)):
+                events.append((DELETED, path, None))
+        if events:
+            self.on_events(events)
+        return events
+
+    def _take_snapshot(self):
+        with self._lock:
+            dirs = dict(self._dirs)
+            files = set(self._files)
+
+        snapshot = {}
+        for root, recursive in dirs.items():
+            stack = [root]
+            while stack:
+                directory = stack.pop()
+                try:
+                    with os.scandir(directory) as it:
+                        for item in it:
+                            try:
+                                if item.is_dir(follow_symlinks=False):
+                                    if recursive:
+                                        stack.append(item.path)
+                                elif item.is_file():
+                                    st = item.stat()
+                                    snapshot[item.path] = (st.st_size, st.st_mtime_ns)
+                            except OSError:
+                                continue
+                except OSError:
+                    continue
+        for path in files:
+            if path in snapshot:
+                continue
+            try:
+                st = os.stat(path)
+                snapshot[path] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                pass
+        return snapshot
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stopped:
+                break
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"File watcher poll error: {e}")
+
+
+class InotifyWatcher:
+    """Linux watcher on top of inotify (through libc, no extra dependency)."""
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, on_events):
+        self.on_events = on_events
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._wds = {}          # watch descriptor -> (directory, recursive)
+        self._paths = {}        # directory -> watch descriptor
+        self._lock = threading.Lock()
+        # stop() writes to this pipe, so the thread can block on select() without a timeout
+        self._wake_r, self._wake_w = os.pipe()
+        self._stopped = False
+        self._thread = None
+
+    def watch_dir(self, path, recursive=True):
+        path = os.path.normpath(path)
+        self._add_watch(path, recursive)
+        if recursive:
+            for directory, subdirs, _ in os.walk(path):
+                for name in subdirs:
+                    self._add_watch(os.path.join(directory, name), True)
+
+    def unwatch_dir(self, path):
+        with self._lock:
+            wd = self._paths.pop(os.path.normpath(path), None)
+            if wd is not None:
+                self._wds.pop(wd, None)
+                self._libc.inotify_rm_watch(self._fd, wd)
+
+    def watch_files(self, paths):
+        # inotify watches directories; events for other files in them are harmless
+        for directory in {os.path.dirname(os.path.normpath(p)) for p in paths}:
+            if directory not in self._paths:
+                self._add_watch(directory, False)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True, name="fs-watcher")
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        try:
+            os.write(self._wake_w, b"\0")
+        except OSError:
+            pass
+
+    def _add_watch(self, path, recursive):
+        with self._lock:
+            if path in self._paths:
+                return
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self.WATCH_MASK)
+            if wd < 0:
+                logger.error(f"inotify_add_watch failed for {path}: {os.strerror(ctypes.get_errno())}")
+                return
+            self._wds[wd] = (path, recursive)
+            self._paths[path] = wd
+
+    def _run(self):
+        while not self._stopped:
+            ready, _, _ = select.select([self._fd, self._wake_r], [], [])
+            if self._wake_r in ready:
+                break
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError as e:
+                logger.error(f"inotify read error: {e}")
+                break
+            try:
+                events = self._parse(data)
+                if events:
+                    self.on_events(events)
+            except Exception as e:
+                logger.error(f"File watcher dispatch error: {e}")
+        for fd in (self._fd, self._wake_r, self._wake_w):
+            os.close(fd)
+
+    def _parse(self, data):
+        events = []
+        moved_from = {}   # cookie -> old path, paired with the IN_MOVED_TO that follows
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            with self._lock:
+                watch = self._wds.get(wd)
+                if mask & self.IN_IGNORED:
+                    self._wds.pop(wd, None)
+                    if watch:
+                        self._paths.pop(watch[0], None)
+            if watch is None:
+                continue
+            directory, recursive = watch
+            path = os.path.join(directory, name) if name else directory
+
+            if mask & self.IN_ISDIR:
+                if recursive and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    self.watch_dir(path, True)
+                continue
+            if mask & self.IN_MOVED_FROM:
+                moved_from[cookie] = path
+            elif mask & self.IN_MOVED_TO:
+                old_path = moved_from.pop(cookie, None)
+                events.append((MOVED, old_path, path) if old_path else (CREATED, path, None))
+            elif mask & self.IN_CREATE:
+                events.append((CREATED, path, None))
+            elif mask & self.IN_CLOSE_WRITE:
+                events.append((MODIFIED, path, None))
+            elif mask & self.IN_DELETE:
+                events.append((DELETED, path, None))
+
+        # Moved out of every watched directory: gone as far as we are concerned
+        events.extend((DELETED, path, None) for path in moved_from.values())
+        return events
+
+
+def create_watcher(on_events, poll_interval=30):
+    """inotify on Linux, polling everywhere else (or if inotify is unavailable)."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(on_events)
+        except Exception as e:
+            logger.error(f"inotify unavailable, falling back to polling: {e}")
+    return PollingWatcher(on_events, poll_interval)
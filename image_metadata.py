@@ -0,0 +1,123 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from tile_renderer import file_signature, read_orientation, reduce_on_load, to_8bit
+
+logger = logging.getLogger(__name__)
+
+# Rows written per SQLite transaction while indexing
+BATCH_SIZE = 256
+
+
+def read_image_metadata(path):
+    """
+    Size, format and EXIF orientation come from the header. The decode-OK flag and
+    the average colour come from a 64px draft decode: JPEGs decode at 1/8 scale,
+    and other formats have to be decoded once to prove they are readable. Only a
+    failed decode marks the file broken.
+    Returns a dict shaped like an image_metadata row, or None if path is missing.
+    """
+    signature = file_signature(path)
+    if signature is None:
+        return None
+    meta = {
+        'path': path, 'mtime_ns': signature[0], 'size': signature[1],
+        'width': None, 'height': None, 'format': None, 'orientation': 1,
+        'avg_color': None, 'ok': 0, 'error': None
+    }
+    try:
+        with Image.open(path) as img:
+            meta['width'], meta['height'] = img.size
+            meta['format'] = img.format
+            meta['orientation'] = read_orientation(img)
+            img.draft(None, (64, 64))
+            img.load()
+            meta['ok'] = 1
+            try:
+                small = to_8bit(reduce_on_load(img, 64, 64))
+                r, g, b = small.convert('RGB').resize((1, 1), Image.Resampling.BOX).getpixel((0, 0))
+                meta['avg_color'] = f"#{r:02x}{g:02x}{b:02x}"
+            except Exception as e:
+                logger.debug(f"Average colour of {path} failed: {e}")
+    except Exception as e:
+        meta['error'] = str(e) or type(e).__name__
+    return meta
+
+
+class MetadataIndex:
+    """
+    Per-file metadata kept in the library database and built in the background when
+    images are added. A row only counts while the file's (mtime_ns, size) still
+    matches, so an edited file is simply indexed again.
+    """
+
+    def __init__(self, store, workers=2, on_broken=None):
+        self.store = store
+        self.workers = workers
+        self.on_broken = on_broken    # on_broken(path, error) for files that fail to decode
+        self._lock = threading.Lock()
+        self._coordinator = None
+        self._pool = None
+
+    def get(self, path, signature=None):
+        """Metadata of the current version of path, or None if it isn't indexed (yet)."""
+        meta = self.store.get_metadata(path)
+        if meta is None:
+            return None
+        if signature is None:
+            signature = file_signature(path)
+        if signature != (meta['mtime_ns'], meta['size']):
+            return None
+        return meta
+
+    def is_usable(self, path):
+        """False only for files known to be missing or undecodable; unindexed files pass."""
+        signature = file_signature(path)
+        if signature is None:
+            return False
+        meta = self.get(path, signature)
+        return meta is None or bool(meta['ok'])
+
+    def index_many(self, paths):
+        """Queues paths for indexing; files already indexed at their current version are skipped."""
+        paths = list(paths)
+        if not paths:
+            return
+        with self._lock:
+            if self._coordinator is None:
+                self._coordinator = ThreadPoolExecutor(max_workers=1, thread_name_prefix="metadata")
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="metadata-read")
+            self._coordinator.submit(self._index, paths)
+
+    def remove(self, path):
+        self.store.remove_metadata(path)
+
+    def shutdown(self):
+        with self._lock:
+            coordinator, self._coordinator = self._coordinator, None
+            pool, self._pool = self._pool, None
+        if coordinator:
+            coordinator.shutdown(wait=False, cancel_futures=True)
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _index(self, paths):
+        try:
+            stale = [p for p in dict.fromkeys(paths) if self.get(p) is None]
+            pool = self._pool
+            if not stale or pool is None:
+                return
+            indexed = broken = 0
+            for start in range(0, len(stale), BATCH_SIZE):
+                rows = [m for m in pool.map(read_image_metadata, stale[start:start + BATCH_SIZE]) if m]
+                self.store.put_metadata(rows)
+                indexed += len(rows)
+                for meta in rows:
+                    if not meta['ok']:
+                        broken += 1
+                        if self.on_broken:
+                            self.on_broken(meta['path'], meta['error'])
+            logger.info(f"Indexed metadata of {indexed} images ({broken} unreadable)")
+        except Exception as e:
+            logger.error(f"Metadata index error: {e}")
@@ -0,0 +1,420 @@
+import sqlite3
+import threading
+from collections.abc import Sequence
+
+# Positions are floats so a reorder only rewrites the moved row; when two
+# neighbours get closer than this the monitor's playlist is renumbered.
+MIN_POSITION_GAP = 1e-9
+
+# Rows fetched per index seek while walking a playlist
+WALK_BATCH = 16
+
+
+class LibraryStore:
+    """
+    SQLite (WAL) store for per-monitor playlists.
+
+    Rows are (monitor, path, position) with the primary key on (monitor, path) and an
+    index on (monitor, position), so membership, insert, remove and reorder are index
+    lookups instead of Python list scans.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS playlist_items (
+                monitor TEXT NOT NULL,
+                path TEXT NOT NULL,
+                position REAL NOT NULL,
+                PRIMARY KEY (monitor, path)
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_playlist_order ON playlist_items (monitor, position)"
+        )
+        # Header facts per file, keyed by path and valid for the stored (mtime_ns, size)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS image_metadata (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                width INTEGER,
+                height INTEGER,
+                format TEXT,
+                orientation INTEGER NOT NULL DEFAULT 1,
+                avg_color TEXT,
+                ok INTEGER NOT NULL,
+                error TEXT
+            ) WITHOUT ROWID
+        """)
+        # Cached row counts so len(playlist) never scans
+        self._counts = {}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def count(self, monitor):
+        with self._lock:
+            if monitor not in self._counts:
+                row = self._conn.execute(
+                    "SELECT COUNT(*) FROM playlist_items WHERE monitor = ?", (monitor,)
+                ).fetchone()
+                self._counts[monitor] = row[0]
+            return self._counts[monitor]
+
+    def has_playlist(self, monitor):
+        return self.count(monitor) > 0
+
+    def contains(self, monitor, path):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM playlist_items WHERE monitor = ? AND path = ?", (monitor, path)
+            ).fetchone()
+            return row is not None
+
+    def path_at(self, monitor, index):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path FROM playlist_items WHERE monitor = ? ORDER BY position LIMIT 1 OFFSET ?",
+                (monitor, index)
+            ).fetchone()
+        if row is None:
+            raise IndexError(index)
+        return row[0]
+
+    def items_after(self, monitor, position=None, limit=WALK_BATCH, include=False):
+        """
+        Up to limit (position, path) pairs following position in playlist order (from
+        the start if None; including position itself with include=True). A seek on
+        the (monitor, position) index, however far into the playlist.
+        """
+        with self._lock:
+            if position is None:
+                rows = self._conn.execute(
+                    "SELECT position, path FROM playlist_items WHERE monitor = ? ORDER BY position LIMIT ?",
+                    (monitor, limit)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT position, path FROM playlist_items WHERE monitor = ? AND position "
+                    + (">=" if include else ">") + " ? ORDER BY position LIMIT ?",
+                    (monitor, position, limit)
+                ).fetchall()
+        return rows
+
+    def position_at(self, monitor, index):
+        positions = self._positions_at(monitor, index, 1)
+        if positions[0] is None:
+            raise IndexError(index)
+        return positions[0]
+
+    def index_of(self, monitor, path):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT position FROM playlist_items WHERE monitor = ? AND path = ?", (monitor, path)
+            ).fetchone()
+            if row is None:
+                raise ValueError(path)
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM playlist_items WHERE monitor = ? AND position < ?", (monitor, row[0])
+            ).fetchone()[0]
+
+    def paths(self, monitor, offset=0, limit=-1):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path FROM playlist_items WHERE monitor = ? ORDER BY position LIMIT ? OFFSET ?",
+                (monitor, limit, offset)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def monitors(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT monitor FROM playlist_items").fetchall()
+        return [row[0] for row in rows]
+
+    def append(self, monitor, path):
+        """Appends path unless the playlist already has it. Returns True if added."""
+        return self.append_many(monitor, [path]) == 1
+
+    def append_many(self, monitor, paths):
+        """Appends every new path in one transaction. Returns the number added."""
+        with self._lock:
+            last = self._conn.execute(
+                "SELECT MAX(position) FROM playlist_items WHERE monitor = ?", (monitor,)
+            ).fetchone()[0]
+            position = 0.0 if last is None else last
+            added = 0
+            self._conn.execute("BEGIN")
+            try:
+                for path in paths:
+                    position += 1.0
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO playlist_items (monitor, path, position) VALUES (?, ?, ?)",
+                        (monitor, path, position)
+                    )
+                    added += cursor.rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._counts.pop(monitor, None)
+                raise
+            if monitor in self._counts:
+                self._counts[monitor] += added
+            return added
+
+    def remove(self, monitor, path):
+        """Removes path from the playlist. Returns True if it was there."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM playlist_items WHERE monitor = ? AND path = ?", (monitor, path)
+            )
+            removed = cursor.rowcount > 0
+            if removed and monitor in self._counts:
+                self._counts[monitor] -= 1
+            return removed
+
+    def remove_path_everywhere(self, path):
+        """Removes a file from every playlist. Returns the monitors that had it."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT monitor FROM playlist_items WHERE path = ?", (path,)
+            ).fetchall()
+            if rows:
+                self._conn.execute("DELETE FROM playlist_items WHERE path = ?", (path,))
+                for (monitor,) in rows:
+                    self._counts.pop(monitor, None)
+        return [row[0] for row in rows]
+
+    def rename_path(self, old_path, new_path):
+        """Points every playlist entry of old_path at new_path, keeping its position."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT monitor FROM playlist_items WHERE path = ?", (old_path,)
+            ).fetchall()
+            if rows:
+                self._conn.execute("BEGIN")
+                try:
+                    # A playlist that already has new_path just loses the old entry
+                    self._conn.execute(
+                        "UPDATE OR IGNORE playlist_items SET path = ? WHERE path = ?", (new_path, old_path)
+                    )
+                    self._conn.execute("DELETE FROM playlist_items WHERE path = ?", (old_path,))
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                finally:
+                    for (monitor,) in rows:
+                        self._counts.pop(monitor, None)
+        return [row[0] for row in rows]
+
+    def all_paths(self):
+        """Every distinct path in any playlist."""
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT path FROM playlist_items").fetchall()
+        return [row[0] for row in rows]
+
+    def get_metadata(self, path):
+        """Stored metadata row of path as a dict, or None."""
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM image_metadata WHERE path = ?", (path,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip((d[0] for d in cursor.description), row))
+
+    def put_metadata(self, rows):
+        """Inserts or replaces metadata dicts (keys as in the image_metadata table)."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO image_metadata "
+                    "(path, mtime_ns, size, width, height, format, orientation, avg_color, ok, error) "
+                    "VALUES (:path, :mtime_ns, :size, :width, :height, :format, :orientation, :avg_color, :ok, :error)",
+                    rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def remove_metadata(self, path):
+        with self._lock:
+            self._conn.execute("DELETE FROM image_metadata WHERE path = ?", (path,))
+
+    def replace(self, monitor, paths):
+        """Replaces the whole playlist of a monitor."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM playlist_items WHERE monitor = ?", (monitor,))
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO playlist_items (monitor, path, position) VALUES (?, ?, ?)",
+                    ((monitor, path, float(i + 1)) for i, path in enumerate(paths))
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._counts.pop(monitor, None)
+
+    def move(self, monitor, src_index, dest_index):
+        """Moves the item at src_index so it ends up at dest_index. Returns True if moved."""
+        with self._lock:
+            count = self.count(monitor)
+            if not (0 <= src_index < count and 0 <= dest_index < count) or src_index == dest_index:
+                return False
+
+            path = self.path_at(monitor, src_index)
+            # Neighbours the item lands between, once it is taken out of the list
+            if dest_index > src_index:
+                before, after = self._positions_at(monitor, dest_index, 2)
+            else:
+                before, after = self._positions_at(monitor, dest_index - 1, 2)
+
+            if before is not None and after is not None and after - before < MIN_POSITION_GAP:
+                self._renumber(monitor)
+                return self.move(monitor, src_index, dest_index)
+
+            if before is None:
+                position = after - 1.0
+            elif after is None:
+                position = before + 1.0
+            else:
+                position = (before + after) / 2.0
+
+            self._conn.execute(
+                "UPDATE playlist_items SET position = ? WHERE monitor = ? AND path = ?",
+                (position, monitor, path)
+            )
+            return True
+
+    def _positions_at(self, monitor, index, n):
+        """Positions of n consecutive items starting at index; out-of-range slots are None."""
+        result = [None] * n
+        start = max(index, 0)
+        rows = self._conn.execute(
+            "SELECT position FROM playlist_items WHERE monitor = ? ORDER BY position LIMIT ? OFFSET ?",
+            (monitor, n - (start - index), start)
+        ).fetchall()
+        for i, row in enumerate(rows):
+            result[start - index + i] = row[0]
+        return result
+
+    def _renumber(self, monitor):
+        paths = self.paths(monitor)
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(
+                "UPDATE playlist_items SET position = ? WHERE monitor = ? AND path = ?",
+                ((float(i + 1), monitor, path) for i, path in enumerate(paths))
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+
+class Playlist(Sequence):
+    """Read-only list view over one monitor's playlist in a LibraryStore."""
+
+    def __init__(self, store, monitor):
+        self.store = store
+        self.monitor = monitor
+
+    def __len__(self):
+        return self.store.count(self.monitor)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return self.store.paths(self.monitor)[index]
+            return self.store.paths(self.monitor, start, max(0, stop - start))
+        if index < 0:
+            index += len(self)
+        if index < 0:
+            raise IndexError(index)
+        return self.store.path_at(self.monitor, index)
+
+    def __contains__(self, path):
+        return self.store.contains(self.monitor, path)
+
+    def __iter__(self):
+        return iter(self.store.paths(self.monitor))
+
+    def items(self, after=None, include=False):
+        """(position, path) pairs from after (see LibraryStore.items_after) to the end, fetched lazily."""
+        rows = self.store.items_after(self.monitor, after, WALK_BATCH, include)
+        while rows:
+            yield from rows
+            rows = self.store.items_after(self.monitor, rows[-1][0], WALK_BATCH)
+
+    def walk(self, cursor=None, include=False):
+        """
+        Every item once as (cursor, path): from just after cursor (from cursor itself
+        with include=True, from the start if None) to the end, then around from the
+        start. Cursors are positions, so each step is an index seek and a saved cursor
+        stays put when items before it are added, removed or moved.
+        """
+        if not is_position(cursor):
+            yield from self.items()
+            return
+        yield from self.items(cursor, include)
+        for position, path in self.items():
+            if position > cursor or (include and position == cursor):
+                return
+            yield position, path
+
+    def cursor_at(self, index):
+        return self.store.position_at(self.monitor, index)
+
+    def index(self, path, start=0, stop=None):
+        index = self.store.index_of(self.monitor, path)
+        if index < start or (stop is not None and index >= stop):
+            raise ValueError(path)
+        return index
+
+    def __eq__(self, other):
+        if isinstance(other, (Playlist, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Playlist({self.monitor!r}, {len(self)} images)"
+
+
+def is_position(cursor):
+    return isinstance(cursor, (int, float)) and not isinstance(cursor, bool)
+
+
+def walk_playlist(images, cursor=None, include=False):
+    """
+    (cursor, path) through any playlist once, see Playlist.walk. Plain sequences
+    fall back to their indices as cursors.
+    """
+    if hasattr(images, 'walk'):
+        return images.walk(cursor, include)
+    count = len(images)
+    start = 0
+    if isinstance(cursor, int) and not isinstance(cursor, bool) and count:
+        start = cursor % count if include else (cursor + 1) % count
+    return ((index % count, images[index % count]) for index in range(start, start + count))
+
+
+def playlist_cursor(images, cfg):
+    """A monitor's saved playlist cursor. Configs written before cursors only have 'last_index'."""
+    cursor = cfg.get('last_position')
+    if cursor is not None:
+        return cursor
+    if 'last_index' in cfg and len(images):
+        index = cfg['last_index'] % len(images)
+        return images.cursor_at(index) if hasattr(images, 'cursor_at') else index
+    return None
@@ -2,8 +2,20 @@ import flet as ft
 import os
 import sys
 import threading
+import multiprocessing
 import time
-from wallpaper_service import service
+from collections import deque
+from wallpaper_service import get_service
+from rotation_engine import RotationEngine, SystemWallpaperSetter
+from metrics import STAGES
+from tile_renderer import FIT_COVER, FIT_MODES
+
+# Created in main(): spawned render workers import this module and must not build a service
+service = None
+
+# Log panel: lines kept on screen, and the fastest it is redrawn (seconds between flushes)
+LOG_LINES = 50
+LOG_FLUSH_INTERVAL = 0.1
 
 def resource_path(relative_path):
     """Get absolute path to resource, works for dev and PyInstaller"""
@@ -203,16 +215,21 @@ class App(ft.Column):
         self.selected_monitor = None
         self.monitor_cards = {}
         
+        # Log lines waiting for the next panel flush; bounded so a burst can't pile up
+        self.pending_logs = deque(maxlen=LOG_LINES)
+        self.log_event = threading.Event()
+        threading.Thread(target=self.run_log_flush, daemon=True).start()
+        
         # UI Components
         self.setup_ui()
         
         # Load Monitors
         self.load_monitors()
         
-        # Background Timer Thread
-        self.stop_event = threading.Event()
-        self.timer_thread = threading.Thread(target=self.run_timer, daemon=True)
-        self.timer_thread.start()
+        # Rotation runs in the UI-independent engine; the window only edits its config
+        self.engine = RotationEngine(service, SystemWallpaperSetter(service))
+        self.engine.start()
+        service.add_config_listener(self.on_config_changed)
 
     def setup_ui(self):
         self.controls.clear()
@@ -323,6 +340,15 @@ class App(ft.Column):
         
         self.input_interval = NumberStepper(value=60, on_change=None)
 
+        self.dropdown_fit = ft.Dropdown(
+            label=self.lm.t("fit_mode"),
+            value=FIT_COVER,
+            options=[ft.dropdown.Option(mode, self.lm.t(f"fit_{mode}")) for mode in FIT_MODES],
+            disabled=True,
+            width=160,
+            text_size=12
+        )
+
         # Action Buttons
         self.btn_save = ft.ElevatedButton(
             self.lm.t("save"), 
@@ -348,6 +374,21 @@ class App(ft.Column):
             )
         )
         
+        self.btn_add_folder = ft.ElevatedButton(
+            self.lm.t("add_folder"), 
+            icon=ft.Icons.CREATE_NEW_FOLDER_ROUNDED, 
+            on_click=lambda _: self.folder_picker.get_directory_path(),
+            bgcolor=ft.Colors.GREY_800,
+            color=ft.Colors.WHITE,
+            style=ft.ButtonStyle(
+                padding=15,
+                shape=ft.RoundedRectangleBorder(radius=8)
+            )
+        )
+        
+        # Folder sources of the selected monitor
+        self.folder_chips = ft.Row(spacing=8, wrap=True, expand=True)
+        
         self.btn_clear_all = ft.TextButton(
             self.lm.t("clear_all"), 
             icon=ft.Icons.DELETE_SWEEP_OUTLINED, 
@@ -368,6 +409,8 @@ class App(ft.Column):
                 ft.Row([
                     self.switch_enabled,
                     ft.Container(width=10),
+                    self.dropdown_fit,
+                    ft.Container(width=10),
                     self.input_interval,
                     ft.Container(width=10),
                     self.btn_save
@@ -383,8 +426,15 @@ class App(ft.Column):
             spacing=15,
             run_spacing=15,
             padding=20,
-            expand=True
+            expand=True,
+            on_scroll=self.on_grid_scroll
         )
+        
+        # Only a window of the playlist has controls; see load_images / fill_grid
+        self.grid_page_size = 60
+        self.grid_images = []
+        self.grid_paths = []
+        self.grid_limit = self.grid_page_size
 
         self.main_content = ft.Container(
             expand=True,
@@ -398,7 +448,8 @@ class App(ft.Column):
                 self.monitor_settings_panel,
                 ft.Container(height=10),
                 ft.Row([
-                    ft.Container(expand=True), 
+                    self.folder_chips, 
+                    self.btn_add_folder,
                     self.btn_add_images
                 ], alignment=ft.MainAxisAlignment.END),
                 ft.Container(height=10),
@@ -418,6 +469,8 @@ class App(ft.Column):
 
         self.file_picker = ft.FilePicker(on_result=self.on_file_pick)
         self.page.overlay.append(self.file_picker)
+        self.folder_picker = ft.FilePicker(on_result=self.on_folder_pick)
+        self.page.overlay.append(self.folder_picker)
 
         # Build Layout
         self.controls = [
@@ -454,6 +507,10 @@ class App(ft.Column):
             self.update()
             self.page.update()
 
+        def toggle_pinned_pool(e):
+            # Warming renders the whole playlist, so it runs on the service's own thread
+            service.set_pinned_pool(e.control.value)
+
         def close_settings(e):
             print("Closing settings")
             self.settings_overlay.visible = False
@@ -476,6 +533,21 @@ class App(ft.Column):
             on_change=toggle_logs
         )
 
+        pinned_pool_switch = ft.Switch(
+            label=self.lm.t("pinned_pool"),
+            value=service.pinned_pool is not None,
+            on_change=toggle_pinned_pool
+        )
+
+        stats_text = ft.Text(self.format_stats(service.get_stats()), size=11,
+                             color=ft.Colors.GREY_400, font_family="monospace", selectable=True)
+
+        def export_stats(e):
+            path = service.dump_stats()
+            stats_text.value = self.format_stats(service.get_stats())
+            stats_text.update()
+            self.update_log(self.lm.t("stats_exported", path=path))
+
         # Create overlay with settings panel
         settings_panel = ft.Container(
             content=ft.Column([
@@ -488,7 +560,14 @@ class App(ft.Column):
                 lang_dropdown,
                 ft.Container(height=20),
                 log_switch,
-                ft.Container(height=20),
+                pinned_pool_switch,
+                ft.Container(height=10),
+                ft.Row([
+                    ft.Text(self.lm.t("performance"), weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE),
+                    ft.TextButton(self.lm.t("export_stats"), on_click=export_stats)
+                ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+                stats_text,
+                ft.Container(height=10),
                 ft.ElevatedButton(
                     "OK",
                     on_click=close_settings,
@@ -530,20 +609,53 @@ class App(ft.Column):
         self.page.update()
         print("Settings overlay added and visible")
 
+    def format_stats(self, stats):
+        """A few lines of get_stats() for the settings panel: p50/p90 per stage, cache and memory."""
+        lines = []
+        for stage in ("rotation",) + STAGES:
+            summary = stats['stages'].get(stage)
+            if summary and summary['count']:
+                lines.append(f"{stage:<9} p50 {summary['p50_ms']:>8.1f} ms  p90 {summary['p90_ms']:>8.1f} ms")
+        cache = stats['tile_cache']
+        lines.append(f"tile cache {cache['hit_ratio']:.0%} hits, {cache['bytes'] // (1024 * 1024)} MiB")
+        pool = stats.get('pinned_pool')
+        if pool:
+            lines.append(f"pinned pool {pool['hit_ratio']:.0%} hits, {pool['tiles']} tiles, {pool['fill_ratio']:.0%} full")
+        if stats['peak_rss_kb']:
+            lines.append(f"peak RSS {stats['peak_rss_kb'] // 1024} MiB")
+        return "\n".join(lines)
+
     def update_log(self, message):
+        # Called from worker threads; only queues, run_log_flush draws
         if not self.show_logs: return
         timestamp = time.strftime("%H:%M")
-        self.log_list.controls.insert(0, ft.Text(f"[{timestamp}] {message}", size=11, font_family="Consolas", color=ft.Colors.BLUE_GREY_200))
-        if len(self.log_list.controls) > 50:
-            self.log_list.controls.pop()
-        try:
-            if self.page:
-                self.log_list.update()
-        except:
-            pass
-
-    def load_monitors(self):
-        service.detect_monitors()
+        self.pending_logs.append(f"[{timestamp}] {message}")
+        self.log_event.set()
+
+    def run_log_flush(self):
+        """Draws queued log lines in one update per frame instead of one per message."""
+        while True:
+            self.log_event.wait()
+            self.log_event.clear()
+            lines = []
+            while self.pending_logs:
+                lines.append(self.pending_logs.popleft())
+            if lines and self.show_logs:
+                controls = self.log_list.controls
+                for line in lines:
+                    controls.insert(0, ft.Text(line, size=11, font_family="Consolas", color=ft.Colors.BLUE_GREY_200))
+                del controls[LOG_LINES:]
+                try:
+                    if self.page:
+                        self.log_list.update()
+                except:
+                    pass
+            time.sleep(LOG_FLUSH_INTERVAL)
+
+    def load_monitors(self, detect=True):
+        # A reload re-enumerates: the topology hint can miss a rearrangement, and some backends aren't polled
+        if detect:
+            service.detect_monitors(force=True)
         self.sidebar_content.controls.clear()
         self.monitor_cards = {}
         
@@ -557,7 +669,19 @@ class App(ft.Column):
             card.set_active(config.get('enabled', False))
             
         if service.monitors:
-            self.select_monitor(service.monitors[0]['name'])
+            names = [m['name'] for m in service.monitors]
+            self.select_monitor(self.selected_monitor if self.selected_monitor in names else names[0])
+
+    def on_config_changed(self, monitor_name, key):
+        # A display was plugged, unplugged or rearranged
+        if key == 'monitors':
+            # The service has just detected the new layout
+            self.load_monitors(detect=False)
+            try:
+                if self.page:
+                    self.update()
+            except:
+                pass
 
     def select_monitor(self, name):
         # Deselect old
@@ -581,83 +705,148 @@ class App(ft.Column):
         self.switch_enabled.value = config.get('enabled', False)
         
         self.input_interval.set_value(config.get('interval', 60))
+        self.dropdown_fit.disabled = False
+        self.dropdown_fit.value = service.get_fit_mode(name)
         
+        self.load_folders()
         self.load_images(config.get('images', []))
         if self.page:
              self.page.update()
 
     def load_images(self, images):
+        """Resets the grid to the first page of images; further pages load while scrolling."""
+        self.grid_images = images
+        self.grid_paths = []
+        self.grid_limit = self.grid_page_size
         self.images_grid.controls.clear()
-        
-        for i, img_path in enumerate(images):
-            # Overlay Buttons (More Subtle)
-            delete_btn = ft.Container(
-                content=ft.Icon(ft.Icons.CLOSE_ROUNDED, size=16, color=ft.Colors.WHITE70),
-                width=24, height=24,
-                bgcolor=ft.Colors.BLACK54,
-                border_radius=12,
-                alignment=ft.alignment.center,
-                on_click=lambda e, p=img_path: self.remove_image(p),
-                tooltip="Kaldır"
-            )
-            
-            # Draggable Image Card
-            img_card = ft.Container(
-                content=ft.Stack([
-                    ft.Image(
-                        src=img_path, 
-                        fit=ft.ImageFit.COVER, 
-                        border_radius=8, 
-                        opacity=1.0,
-                        width=160, # Explicit width to fill container
-                        height=100 # Explicit height to fill container
-                    ),
-                    ft.Container(
-                        content=delete_btn,
-                        right=5,
-                        top=5,
-                        visible=False,
-                    )
-                ]),
-                bgcolor="#20232a",
-                border_radius=8,
-                shadow=ft.BoxShadow(
-                    spread_radius=1,
-                    blur_radius=5,
-                    color=ft.Colors.BLACK54,
-                    offset=ft.Offset(0, 2),
-                ),
-                width=160,
-                height=100
-            )
-            
-            # Make delete button always visible but cleaner
-            img_card.content.controls[1].visible = True 
-
-            draggable = ft.Draggable(
-                group="images",
-                content=img_card,
-                content_feedback=ft.Container(
-                    width=120, height=80, 
-                    content=ft.Image(src=img_path, fit=ft.ImageFit.COVER, opacity=0.8, border_radius=8),
-                ),
-                data=i 
-            )
+        self.fill_grid()
 
-            drag_target = ft.DragTarget(
-                group="images",
-                content=draggable,
-                on_accept=lambda e, idx=i: self.on_drag_accept(e, idx)
-            )
-            
-            self.images_grid.controls.append(drag_target)
+    def fill_grid(self):
+        """Appends cards until the grid shows grid_limit images (or all of them)."""
+        start = len(self.grid_paths)
+        stop = min(self.grid_limit, len(self.grid_images))
+        if start < stop:
+            for img_path in self.grid_images[start:stop]:
+                self.grid_paths.append(img_path)
+                self.images_grid.controls.append(self.build_image_card(img_path))
 
         if self.images_grid.page:
              self.images_grid.update()
+
+    def on_grid_scroll(self, e: ft.OnScrollEvent):
+        # Near the bottom: build the next page on demand
+        if e.max_scroll_extent is not None and e.pixels >= e.max_scroll_extent - 300:
+            if len(self.grid_paths) < len(self.grid_images):
+                self.grid_limit = len(self.grid_paths) + self.grid_page_size
+                self.fill_grid()
+
+    def build_image_card(self, img_path):
+        # Overlay Buttons (More Subtle)
+        delete_btn = ft.Container(
+            content=ft.Icon(ft.Icons.CLOSE_ROUNDED, size=16, color=ft.Colors.WHITE70),
+            width=24, height=24,
+            bgcolor=ft.Colors.BLACK54,
+            border_radius=12,
+            alignment=ft.alignment.center,
+            on_click=lambda e, p=img_path: self.remove_image(p),
+            tooltip="Kaldır"
+        )
+        
+        # Grid shows a small cached thumbnail, never the full-resolution original;
+        # a placeholder stands in until the background pool has generated it
+        thumb_image = ft.Image(
+            src=None,
+            fit=ft.ImageFit.COVER, 
+            border_radius=8, 
+            opacity=1.0,
+            width=160, # Explicit width to fill container
+            height=100, # Explicit height to fill container
+            visible=False
+        )
+        feedback_image = ft.Image(src=None, fit=ft.ImageFit.COVER, opacity=0.8, border_radius=8, visible=False)
+        
+        thumb_path = service.thumbnails.request(
+            img_path,
+            lambda path, thumb, image=thumb_image, feedback=feedback_image: self.on_thumbnail_ready(thumb, image, feedback)
+        )
+        if thumb_path:
+            self.show_thumbnail(thumb_path, thumb_image, feedback_image)
+        
+        # Draggable Image Card
+        img_card = ft.Container(
+            content=ft.Stack([
+                ft.Container(
+                    content=ft.Icon(ft.Icons.IMAGE_OUTLINED, size=28, color=ft.Colors.GREY_700),
+                    alignment=ft.alignment.center,
+                    width=160,
+                    height=100
+                ),
+                thumb_image,
+                ft.Container(
+                    content=delete_btn,
+                    right=5,
+                    top=5,
+                    visible=False,
+                )
+            ]),
+            bgcolor="#20232a",
+            border_radius=8,
+            shadow=ft.BoxShadow(
+                spread_radius=1,
+                blur_radius=5,
+                color=ft.Colors.BLACK54,
+                offset=ft.Offset(0, 2),
+            ),
+            width=160,
+            height=100
+        )
+        
+        # Make delete button always visible but cleaner
+        img_card.content.controls[2].visible = True 
+
+        draggable = ft.Draggable(
+            group="images",
+            content=img_card,
+            content_feedback=ft.Container(
+                width=120, height=80, 
+                bgcolor="#20232a",
+                border_radius=8,
+                content=feedback_image,
+            ),
+            data=img_path 
+        )
+
+        drag_target = ft.DragTarget(
+            group="images",
+            content=draggable,
+            on_accept=self.on_drag_accept
+        )
         
-    def on_drag_accept(self, e: ft.DragTargetEvent, dest_index):
+        return drag_target
+
+    def show_thumbnail(self, thumb_path, image, feedback):
+        image.src = thumb_path
+        image.visible = True
+        feedback.src = thumb_path
+        feedback.visible = True
+
+    def on_thumbnail_ready(self, thumb_path, image, feedback):
+        # Runs on a thumbnail worker thread; the card may already be gone from the grid
+        if not thumb_path:
+            return
+        self.show_thumbnail(thumb_path, image, feedback)
         try:
-             src_index = self.page.get_control(e.src_id).data
+            if image.page:
+                image.update()
+        except Exception:
+            pass
+
+    def on_drag_accept(self, e: ft.DragTargetEvent):
+        try:
+             src_path = self.page.get_control(e.src_id).data
+             # Loaded cards are a prefix of the playlist, so grid position == playlist index
+             src_index = self.grid_paths.index(src_path)
+             dest_index = self.images_grid.controls.index(e.control)
              if src_index != dest_index:
                  self.shift_image(src_index, dest_index)
         except Exception:
@@ -665,9 +854,12 @@ class App(ft.Column):
 
     def shift_image(self, src_index, dest_index):
         if self.selected_monitor:
-            service.shift_image(self.selected_monitor, src_index, dest_index)
-            config = service.get_config(self.selected_monitor)
-            self.load_images(config.get('images', []))
+            if service.shift_image(self.selected_monitor, src_index, dest_index):
+                # Move the existing card instead of rebuilding the grid
+                self.grid_paths.insert(dest_index, self.grid_paths.pop(src_index))
+                self.images_grid.controls.insert(dest_index, self.images_grid.controls.pop(src_index))
+                if self.images_grid.page:
+                    self.images_grid.update()
             
     def save_settings(self, e):
          if self.selected_monitor:
@@ -676,6 +868,8 @@ class App(ft.Column):
             
             service.update_config(self.selected_monitor, 'interval', val)
             service.update_config(self.selected_monitor, 'enabled', is_enabled)
+            if self.dropdown_fit.value != service.get_fit_mode(self.selected_monitor):
+                service.set_fit_mode(self.selected_monitor, self.dropdown_fit.value)
             
             # Update Active Status in Sidebar
             if self.monitor_cards.get(self.selected_monitor):
@@ -691,24 +885,50 @@ class App(ft.Column):
     def on_file_pick(self, e: ft.FilePickerResultEvent):
         if e.files and self.selected_monitor:
             new_images = [f.path for f in e.files]
-            config = service.get_config(self.selected_monitor)
-            current_images = config.get('images', [])
-            
-            updated_images = current_images + new_images
-            service.update_config(self.selected_monitor, 'images', updated_images)
-            self.load_images(updated_images)
+            service.add_images(self.selected_monitor, new_images)
+            # New images go to the end; they only need cards if the grid already reaches it
+            self.grid_images = service.get_config(self.selected_monitor).get('images', [])
+            self.fill_grid()
             self.page.snack_bar = ft.SnackBar(ft.Text(f"{len(new_images)} resim eklendi"), bgcolor=ft.Colors.GREEN_900)
             self.page.snack_bar.open = True
             self.page.update()
 
+    def load_folders(self):
+        self.folder_chips.controls.clear()
+        for folder in service.get_folders(self.selected_monitor):
+            self.folder_chips.controls.append(ft.Container(
+                content=ft.Row([
+                    ft.Icon(ft.Icons.FOLDER_ROUNDED, size=14, color=ft.Colors.AMBER_300),
+                    ft.Text(os.path.basename(folder['path']) or folder['path'], size=11, color=ft.Colors.GREY_300, tooltip=folder['path']),
+                    ft.Container(
+                        content=ft.Icon(ft.Icons.CLOSE_ROUNDED, size=12, color=ft.Colors.GREY_500),
+                        on_click=lambda e, p=folder['path']: self.remove_folder(p)
+                    )
+                ], spacing=5, tight=True),
+                padding=ft.padding.symmetric(horizontal=10, vertical=5),
+                bgcolor="#252830",
+                border_radius=12
+            ))
+        if self.folder_chips.page:
+            self.folder_chips.update()
+
+    def on_folder_pick(self, e: ft.FilePickerResultEvent):
+        if e.path and self.selected_monitor:
+            if service.add_folder(self.selected_monitor, e.path):
+                self.load_folders()
+
+    def remove_folder(self, path):
+        if self.selected_monitor and service.remove_folder(self.selected_monitor, path):
+            self.load_folders()
+
     def remove_image(self, path):
          if self.selected_monitor:
-            config = service.get_config(self.selected_monitor)
-            current_images = config.get('images', [])
-            if path in current_images:
-                current_images.remove(path)
-                service.update_config(self.selected_monitor, 'images', current_images)
-                self.load_images(current_images)
+            if service.remove_image(self.selected_monitor, path) and path in self.grid_paths:
+                index = self.grid_paths.index(path)
+                self.grid_paths.pop(index)
+                self.images_grid.controls.pop(index)
+                # Pull the next image up into the window, if there is one
+                self.fill_grid()
 
     def clear_all_images(self, e):
         if self.selected_monitor:
@@ -718,53 +938,13 @@ class App(ft.Column):
              self.page.snack_bar.open = True
              self.page.update()
 
-    def run_timer(self):
-        """Background thread to check timers for each monitor and update wallpaper."""
-        last_checks = {} 
-        current_wallpapers = {} 
-        
-        # Load init state
-        for m in service.monitors:
-            last_checks[m['name']] = 0
-            cfg = service.get_config(m['name'])
-            if cfg.get('images'):
-                current_wallpapers[m['name']] = cfg['images'][0]
-
-        while not self.stop_event.is_set():
-            now = time.time()
-            needs_update = False
-            
-            for m in service.monitors:
-                name = m['name']
-                cfg = service.get_config(name)
-                
-                if cfg.get('enabled') and cfg.get('images'):
-                    interval = cfg.get('interval', 60)
-                    if now - last_checks.get(name, 0) >= interval:
-                        last_checks[name] = now
-                        images = cfg['images']
-                        idx = cfg.get('last_index', 0)
-                        idx = (idx + 1) % len(images)
-                        service.update_config(name, 'last_index', idx)
-                        current_wallpapers[name] = images[idx]
-                        needs_update = True
-                
-                if cfg.get('enabled') and cfg.get('images') and name not in current_wallpapers:
-                     current_wallpapers[name] = cfg['images'][0]
-                     needs_update = True
-
-            if needs_update:
-                final_path = service.generate_stitched_wallpaper(current_wallpapers)
-                if final_path:
-                    service.set_system_wallpaper(final_path)
-            
-            time.sleep(1)
-
 
 import pystray
 from PIL import Image as PilImage
 
 def main(page: ft.Page):
+    global service
+    service = get_service()
     app = App(page)
     page.add(app)
     
@@ -777,6 +957,8 @@ def main(page: ft.Page):
 
     def on_tray_exit(icon, item):
         icon.stop()
+        # os._exit skips atexit handlers, so write pending config changes first
+        service.flush_configs()
         page.window.destroy()
         os._exit(0)
 
@@ -820,6 +1002,9 @@ def main(page: ft.Page):
     page.update() 
 
 if __name__ == "__main__":
+    # Render pool workers in a frozen (PyInstaller) build start through this entry point
+    multiprocessing.freeze_support()
+
     # Fix for Windows Taskbar Icon
     try:
         import ctypes
@@ -0,0 +1,202 @@
+import os
+import sys
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# Pipeline stages, in the order a rotation goes through them
+STAGES = ("decode", "resize", "paste", "encode", "write", "apply")
+
+# Upper bounds (ms) of the histogram buckets; the last bucket is open-ended
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+def summarize(samples):
+    """count / mean / percentiles / max (ms) and a bucket histogram of a list of seconds."""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    n = len(ordered)
+
+    def percentile(p):
+        return ordered[min(n - 1, int(p * n))] * 1000
+
+    histogram = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+    for seconds in ordered:
+        ms = seconds * 1000
+        for i, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if ms <= bound:
+                histogram[i] += 1
+                break
+        else:
+            histogram[-1] += 1
+    return {
+        'count': n,
+        'mean_ms': round(sum(ordered) / n * 1000, 3),
+        'p50_ms': round(percentile(0.50), 3),
+        'p90_ms': round(percentile(0.90), 3),
+        'p99_ms': round(percentile(0.99), 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+        'histogram': histogram,
+    }
+
+
+class PipelineMetrics:
+    """
+    Rolling per-stage timings of the rendering pipeline.
+
+    Every stage keeps its last `window` samples overall and per monitor, which is
+    what the percentiles and histograms are computed from. Samples recorded while a
+    tick is open on the same thread are also summed into that tick's breakdown; the
+    last `ticks` breakdowns are kept.
+    """
+
+    def __init__(self, window=256, ticks=20):
+        self.window = window
+        self._lock = threading.Lock()
+        self._stages = {}      # stage -> deque of seconds
+        self._monitors = {}    # monitor -> stage -> deque of seconds
+        self._ticks = deque(maxlen=ticks)
+        self._local = threading.local()
+
+    def record(self, stage, seconds, monitor=None):
+        with self._lock:
+            self._stages.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+            if monitor is not None:
+                stages = self._monitors.setdefault(monitor, {})
+                stages.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+        tick = getattr(self._local, 'tick', None)
+        if tick is not None:
+            tick['stages'][stage] = tick['stages'].get(stage, 0.0) + seconds
+            if monitor is not None:
+                per_monitor = tick['monitors'].setdefault(monitor, {})
+                per_monitor[stage] = per_monitor.get(stage, 0.0) + seconds
+
+    def record_many(self, timings, monitor=None):
+        """Records a {stage: seconds} dict, e.g. the one a render worker sent back."""
+        for stage, seconds in timings.items():
+            self.record(stage, seconds, monitor)
+
+    @contextmanager
+    def timer(self, stage, monitor=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, monitor)
+
+    @contextmanager
+    def tick(self, kind):
+        """Groups everything recorded on this thread into one tick breakdown (nesting joins the outer tick)."""
+        if getattr(self._local, 'tick', None) is not None:
+            yield
+            return
+        tick = {'kind': kind, 'time': time.time(), 'stages': {}, 'monitors': {}}
+        self._local.tick = tick
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.tick = None
+            tick['total'] = time.perf_counter() - start
+            self.record(kind, tick['total'])
+            with self._lock:
+                self._ticks.append(tick)
+
+    def last_tick(self):
+        """Breakdown of the most recent tick ({'kind', 'time', 'total', 'stages', 'monitors'}), or None."""
+        with self._lock:
+            return self._ticks[-1] if self._ticks else None
+
+    def snapshot(self):
+        """Summaries of every stage, overall and per monitor, plus the recent tick breakdowns."""
+        with self._lock:
+            stages = {stage: list(samples) for stage, samples in self._stages.items()}
+            monitors = {
+                monitor: {stage: list(samples) for stage, samples in per_stage.items()}
+                for monitor, per_stage in self._monitors.items()
+            }
+            ticks = list(self._ticks)
+
+        def ms(seconds_by_stage):
+            return {stage: round(seconds * 1000, 3) for stage, seconds in seconds_by_stage.items()}
+
+        return {
+            'histogram_buckets_ms': list(HISTOGRAM_BUCKETS_MS),
+            'stages': {stage: summarize(samples) for stage, samples in stages.items()},
+            'monitors': {
+                monitor: {stage: summarize(samples) for stage, samples in per_stage.items()}
+                for monitor, per_stage in monitors.items()
+            },
+            'recent_ticks': [
+                {
+                    'kind': t['kind'], 'time': t['time'], 'total_ms': round(t['total'] * 1000, 3),
+                    'stages_ms': ms(t['stages']),
+                    'monitors_ms': {monitor: ms(per) for monitor, per in t['monitors'].items()},
+                }
+                for t in ticks
+            ],
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._monitors.clear()
+            self._ticks.clear()
+
+
+def dump_json(data, path):
+    """Writes a stats dict as JSON through a temp file so readers never see half a dump."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB, or None where unsupported."""
+    # Linux: VmHWM starts fresh at exec, unlike ru_maxrss which inherits the parent's peak
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if sys.platform == "win32":
+        return _windows_peak_working_set_kb()
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux KiB
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def _windows_peak_working_set_kb():
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return None
+    return counters.PeakWorkingSetSize // 1024
@@ -0,0 +1,233 @@
+import os
+import sys
+import shutil
+import logging
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+SPI_SETDESKWALLPAPER = 0x0014
+SPIF_UPDATEINIFILE = 0x01
+SPIF_SENDCHANGE = 0x02
+
+# GetSystemMetrics indices describing the virtual desktop
+SM_XVIRTUALSCREEN = 76
+SM_YVIRTUALSCREEN = 77
+SM_CXVIRTUALSCREEN = 78
+SM_CYVIRTUALSCREEN = 79
+SM_CMONITORS = 80
+
+# HKCU\Control Panel\Desktop values for a tiled wallpaper starting at the virtual desktop origin
+WALLPAPER_STYLE_VALUES = (("WallpaperStyle", "0"), ("TileWallpaper", "1"))
+
+
+def topology_fingerprint(monitors):
+    """Hashable identity of a monitor set: names and rects, independent of enumeration order."""
+    return tuple(sorted((m['name'], tuple(m['rect'])) for m in monitors))
+
+
+def monitor_info(name, x, y, width, height, handle=0):
+    """Monitor dict as the service uses it; rect is (left, top, right, bottom) in desktop coordinates."""
+    return {
+        'name': name,
+        'handle': handle,
+        'rect': (x, y, x + width, y + height),
+        'width': width,
+        'height': height,
+        'x': x,
+        'y': y
+    }
+
+
+class WindowsBackend:
+    """Monitor enumeration and wallpaper application through user32 and the registry."""
+    name = "windows"
+
+    def __init__(self):
+        # Only touched here, so the rest of the app imports fine on other platforms
+        import ctypes
+        from ctypes import wintypes
+        self._ctypes = ctypes
+        self._wintypes = wintypes
+        self.user32 = ctypes.windll.user32
+
+        class MONITORINFOEX(ctypes.Structure):
+            _fields_ = [
+                ("cbSize", wintypes.DWORD),
+                ("rcMonitor", wintypes.RECT),
+                ("rcWork", wintypes.RECT),
+                ("dwFlags", wintypes.DWORD),
+                ("szDevice", wintypes.WCHAR * 32)
+            ]
+        self._monitor_info_type = MONITORINFOEX
+
+    def topology_hint(self):
+        """Monitor count and virtual desktop rect: five cheap calls instead of a full enumeration."""
+        return tuple(self.user32.GetSystemMetrics(index) for index in (
+            SM_CMONITORS, SM_XVIRTUALSCREEN, SM_YVIRTUALSCREEN, SM_CXVIRTUALSCREEN, SM_CYVIRTUALSCREEN
+        ))
+
+    def enumerate_monitors(self):
+        ctypes, wintypes = self._ctypes, self._wintypes
+        monitors = []
+
+        def enum_monitor_callback(hmonitor, hdc, rect, data):
+            info = self._monitor_info_type()
+            info.cbSize = ctypes.sizeof(self._monitor_info_type)
+            self.user32.GetMonitorInfoW(hmonitor, ctypes.byref(info))
+            r = info.rcMonitor
+            monitors.append(monitor_info(info.szDevice, r.left, r.top, r.right - r.left, r.bottom - r.top, hmonitor))
+            return True
+
+        ENUM_MONITOR_PROC = ctypes.WINFUNCTYPE(ctypes.c_bool, ctypes.c_ulong, ctypes.c_ulong, ctypes.POINTER(wintypes.RECT), ctypes.c_double)
+        self.user32.EnumDisplayMonitors(None, None, ENUM_MONITOR_PROC(enum_monitor_callback), 0)
+        return monitors
+
+    def set_wallpaper(self, path):
+        # 1. Set wallpaper style to Tile (Tiled) which is required for span connection
+        # Registry: HKEY_CURRENT_USER\Control Panel\Desktop -> WallpaperStyle=0, TileWallpaper=1
+        # Only written when they differ; after the first apply they normally already match
+        try:
+            import winreg
+            key = winreg.OpenKey(
+                winreg.HKEY_CURRENT_USER, "Control Panel\\Desktop", 0, winreg.KEY_QUERY_VALUE | winreg.KEY_SET_VALUE
+            )
+            try:
+                for name, value in WALLPAPER_STYLE_VALUES:
+                    try:
+                        current = winreg.QueryValueEx(key, name)[0]
+                    except OSError:
+                        current = None
+                    if current != value:
+                        winreg.SetValueEx(key, name, 0, winreg.REG_SZ, value)
+            finally:
+                winreg.CloseKey(key)
+        except Exception as e:
+            logger.error(f"Registry Set Error: {e}")
+
+        # 2. Call API
+        return bool(self.user32.SystemParametersInfoW(
+            SPI_SETDESKWALLPAPER, 0, path, SPIF_UPDATEINIFILE | SPIF_SENDCHANGE
+        ))
+
+
+class LinuxBackend:
+    """
+    X11/GNOME desktops: monitors from `xrandr --listmonitors`, the composite applied
+    spanned through gsettings, or tiled over the root window with feh.
+    """
+    name = "linux"
+
+    def __init__(self):
+        # picture-options only has to be set once per run
+        self._spanned = False
+
+    def topology_hint(self):
+        # xrandr is the cheapest source there is, so there is nothing cheap to poll
+        return None
+
+    def enumerate_monitors(self):
+        try:
+            output = subprocess.check_output(["xrandr", "--listmonitors"], stderr=subprocess.DEVNULL, timeout=5)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.error(f"xrandr failed: {e}")
+            return []
+        return parse_xrandr_monitors(output.decode('utf-8', 'replace'))
+
+    def set_wallpaper(self, path):
+        if shutil.which("gsettings"):
+            uri = "file://" + path
+            commands = [
+                ["gsettings", "set", "org.gnome.desktop.background", "picture-uri", uri],
+                ["gsettings", "set", "org.gnome.desktop.background", "picture-uri-dark", uri],
+            ]
+            if not self._spanned:
+                commands.insert(0, ["gsettings", "set", "org.gnome.desktop.background", "picture-options", "spanned"])
+        elif shutil.which("feh"):
+            # The composite starts at the top-left of the bounding box, i.e. the root window origin
+            commands = [["feh", "--no-fehbg", "--no-xinerama", "--bg-tile", path]]
+        else:
+            logger.error("No wallpaper setter found (install gsettings or feh)")
+            return False
+        for command in commands:
+            # picture-uri-dark only exists on newer GNOME; the light key is enough elsewhere
+            result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
+            if result.returncode != 0 and command[-2] != "picture-uri-dark":
+                return False
+            if command[-2] == "picture-options":
+                self._spanned = True
+        return True
+
+
+def parse_xrandr_monitors(text):
+    """
+    Parses `xrandr --listmonitors` lines such as
+        0: +*DP-1 2560/597x1440/336+0+0  DP-1
+    into monitor dicts.
+    """
+    monitors = []
+    for line in text.splitlines()[1:]:
+        parts = line.split()
+        if len(parts) < 3:
+            continue
+        try:
+            geometry = parts[2]
+            size, x, y = geometry.split("+")
+            width, height = (int(side.split("/")[0]) for side in size.split("x"))
+        except ValueError:
+            continue
+        name = parts[-1]
+        monitors.append(monitor_info(name, int(x), int(y), width, height, len(monitors)))
+    return monitors
+
+
+class FakeBackend:
+    """
+    In-memory desktop for headless runs, benchmarks and tests: a fixed monitor list,
+    and applied wallpapers are only recorded.
+    """
+    name = "fake"
+
+    def __init__(self, monitors=None):
+        # monitors: monitor dicts or (x, y, width, height) tuples; default one 1080p display
+        monitors = monitors if monitors is not None else [(0, 0, 1920, 1080)]
+        self.monitors = [
+            m if isinstance(m, dict) else monitor_info(f"DISPLAY{i + 1}", *m, handle=i)
+            for i, m in enumerate(monitors)
+        ]
+        self.applied = []
+
+    def topology_hint(self):
+        return topology_fingerprint(self.monitors)
+
+    def enumerate_monitors(self):
+        return [dict(m) for m in self.monitors]
+
+    def set_wallpaper(self, path):
+        self.applied.append(path)
+        return True
+
+
+BACKENDS = {
+    WindowsBackend.name: WindowsBackend,
+    LinuxBackend.name: LinuxBackend,
+    FakeBackend.name: FakeBackend,
+}
+
+
+def create_backend(name=None):
+    """
+    Backend by name ('windows', 'linux', 'fake'); None picks the platform's own,
+    overridable with the DSBG_BACKEND environment variable.
+    """
+    name = name or os.environ.get("DSBG_BACKEND")
+    if not name:
+        if sys.platform == "win32":
+            name = WindowsBackend.name
+        elif sys.platform.startswith("linux") and shutil.which("xrandr"):
+            name = LinuxBackend.name
+        else:
+            name = FakeBackend.name
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown platform backend: {name}")
+    return BACKENDS[name]()
@@ -0,0 +1,100 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from PIL import Image
+from tile_renderer import render_tile, render_tile_into_shared_memory
+
+logger = logging.getLogger(__name__)
+
+
+def default_render_workers():
+    """One worker per spare core, capped: more than a handful of monitors rarely change at once."""
+    return min(4, max(1, (os.cpu_count() or 1) - 1))
+
+
+class TileRenderPool:
+    """
+    Renders monitor tiles in worker processes so several LANCZOS resizes run on
+    separate cores. The parent allocates one shared memory segment per tile and the
+    worker writes the pixels into it, so large images are never pickled.
+    With workers <= 1, or after the pool breaks, tiles are rendered serially in-process.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = None
+        self._broken = False
+
+    @property
+    def parallel(self):
+        return self.workers > 1 and not self._broken
+
+    def render_many(self, jobs, timings=None):
+        """
+        jobs: list of (path, width, height, fit_mode[, orientation]).
+        Returns a list of the same length holding a PIL tile or the exception raised.
+        timings, if given, is a list that receives one {stage: seconds} dict per job.
+        """
+        if timings is not None:
+            timings[:] = [{} for _ in jobs]
+        if not self.parallel or len(jobs) < 2:
+            return [self._render_serial(job, timings[i] if timings is not None else None)
+                    for i, job in enumerate(jobs)]
+
+        segments = []
+        try:
+            executor = self._get_executor()
+            futures = []
+            for job in jobs:
+                width, height = job[1], job[2]
+                shm = shared_memory.SharedMemory(create=True, size=width * height * 3)
+                segments.append(shm)
+                futures.append(executor.submit(render_tile_into_shared_memory, shm.name, *job))
+
+            results = []
+            for i, (shm, future) in enumerate(zip(segments, futures)):
+                try:
+                    size, job_timings = future.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    results.append(e)
+                    continue
+                if timings is not None:
+                    timings[i].update(job_timings)
+                # Copy out so the segment can be released right away
+                view = Image.frombuffer('RGB', size, shm.buf, 'raw', 'RGB', 0, 1)
+                results.append(view.copy())
+                del view
+            return results
+        except BrokenProcessPool as e:
+            logger.error(f"Render pool failed, falling back to serial rendering: {e}")
+            self._broken = True
+            self.shutdown()
+            return [self._render_serial(job, timings[i] if timings is not None else None)
+                    for i, job in enumerate(jobs)]
+        finally:
+            for shm in segments:
+                shm.close()
+                shm.unlink()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    @staticmethod
+    def _render_serial(job, timings=None):
+        path, width, height, fit_mode, *orientation = job
+        try:
+            return render_tile(path, width, height, fit_mode,
+                               orientation=orientation[0] if orientation else None, timings=timings)
+        except Exception as e:
+            return e
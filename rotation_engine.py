@@ -0,0 +1,312 @@
+import os
+import shutil
+import argparse
+import multiprocessing
+import threading
+import time
+import logging
+import itertools
+from scheduler import DeadlineScheduler
+from metrics import peak_rss_kb
+from library_store import walk_playlist, playlist_cursor
+
+logger = logging.getLogger(__name__)
+
+# Consecutive known-broken images a rotation step looks past before giving up
+MAX_SKIPPED_IMAGES = 100
+
+# Seconds before the loop tries again after a tick raised
+ERROR_RETRY_DELAY = 5
+
+
+class NullWallpaperSetter:
+    """Renders but never applies anything. Useful for benchmarking the pipeline."""
+    name = "none"
+
+    def apply(self, path):
+        pass
+
+
+class FileOutputSetter:
+    """Copies every applied composite into an output directory (works on any OS)."""
+    name = "file"
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def apply(self, path):
+        target = os.path.join(self.output_dir, "wallpaper" + os.path.splitext(path)[1])
+        tmp_target = target + ".tmp"
+        shutil.copyfile(path, tmp_target)
+        os.replace(tmp_target, target)
+
+
+class SystemWallpaperSetter:
+    """
+    Applies the composite as the desktop wallpaper through the service. Returns
+    once it is queued; the service's apply worker records the 'apply' timing.
+    """
+    name = "system"
+    asynchronous = True
+
+    def __init__(self, service):
+        self.service = service
+
+    def apply(self, path):
+        self.service.set_system_wallpaper(path)
+
+
+class RotationEngine:
+    """
+    Owns per-monitor timers, index advancement and rendering, independent of any UI.
+    The wallpaper setter is pluggable, see NullWallpaperSetter / FileOutputSetter /
+    SystemWallpaperSetter.
+    """
+
+    def __init__(self, service, setter, scheduler=None):
+        self.service = service
+        self.setter = setter
+        self.scheduler = scheduler or DeadlineScheduler()
+
+        self.last_switch = {}
+        self.current_wallpapers = {}
+        self._topology_changed = False
+        self._refit = False
+        self._thread = None
+        self._stopping = threading.Event()
+
+        self.service.add_config_listener(self.on_config_changed)
+
+    def start(self):
+        """Runs the rotation loop on a daemon thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        # Hot-plugged displays re-render the composite through on_config_changed
+        self.service.start_monitor_watch()
+
+    def stop(self):
+        self._stopping.set()
+        self.scheduler.stop()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def run(self):
+        """Blocking rotation loop: sleeps until the next monitor is due and updates the wallpaper."""
+        # Load init state
+        for m in self.service.monitors:
+            images = self.service.get_playlist(m['name'])
+            if images:
+                self.current_wallpapers[m['name']] = images[0]
+
+        due = []
+        while True:
+            try:
+                self.tick(due)
+            except Exception as e:
+                # Playlists, metadata and monitors change under us on other threads; a failed
+                # tick must not end the loop. Monitors it left unscheduled come back on the retry.
+                logger.error(f"Rotation error: {e}")
+                if self._stopping.wait(ERROR_RETRY_DELAY):
+                    break
+                try:
+                    self.sync_schedule()
+                except Exception as e:
+                    logger.error(f"Rotation schedule error: {e}")
+            due = self.scheduler.wait()
+            if due is None:
+                break
+
+    def tick(self, due):
+        """Advances the given monitors, fills in newly enabled ones and applies the result."""
+        now = self.scheduler.clock()
+        needs_update = False
+
+        if self._topology_changed:
+            self._topology_changed = False
+            present = {m['name'] for m in self.service.monitors}
+            for name in list(self.current_wallpapers):
+                if name not in present:
+                    del self.current_wallpapers[name]
+            needs_update = True
+
+        if self._refit:
+            # Same images, laid out differently
+            self._refit = False
+            if self.current_wallpapers:
+                needs_update = True
+
+        for name in due:
+            cfg = self.service.get_config(name)
+            images = self.service.get_playlist(name)
+            if cfg.get('enabled') and images:
+                self.last_switch[name] = now
+                found = self.next_usable(images, playlist_cursor(images, cfg))
+                if found:
+                    cursor, path = found
+                    self.service.update_config(name, 'last_position', cursor)
+                    self.current_wallpapers[name] = path
+                    needs_update = True
+
+        for m in self.service.monitors:
+            name = m['name']
+            cfg = self.service.get_config(name)
+            if cfg.get('enabled') and name not in self.current_wallpapers:
+                images = self.service.get_playlist(name)
+                found = self.next_usable(images) if images else None
+                if found:
+                    # Nothing shown from this playlist yet: the next step continues from here
+                    if playlist_cursor(images, cfg) is None:
+                        self.service.update_config(name, 'last_position', found[0])
+                    self.current_wallpapers[name] = found[1]
+                    needs_update = True
+
+        self.sync_schedule()
+
+        if needs_update:
+            self.apply_current()
+
+            # Look ahead: render the composite for the next deadline while idle
+            next_wallpapers = self.next_wallpapers()
+            if next_wallpapers:
+                self.service.prerender_wallpaper(next_wallpapers)
+        return needs_update
+
+    def apply_current(self):
+        metrics = self.service.metrics
+        with metrics.tick('rotation'):
+            final_path = self.service.take_prerendered(self.current_wallpapers)
+            if not final_path:
+                final_path = self.service.generate_stitched_wallpaper(self.current_wallpapers)
+            if final_path:
+                if getattr(self.setter, 'asynchronous', False):
+                    self.setter.apply(final_path)
+                else:
+                    with metrics.timer('apply'):
+                        self.setter.apply(final_path)
+        tick = metrics.last_tick()
+        if tick:
+            stages = ", ".join(f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in tick['stages'].items())
+            pool = self.service.pinned_pool
+            if pool is not None:
+                pool_stats = pool.stats()
+                stages += (f"; pinned pool {pool_stats['tiles']} tiles, {pool_stats['fill_ratio']:.0%} full, "
+                           f"hit rate {pool_stats['hit_ratio']:.0%}")
+            logger.info(f"Rotation took {tick['total'] * 1000:.0f}ms ({stages}), peak RSS {peak_rss_kb()} KiB")
+        return final_path
+
+    def sync_schedule(self):
+        """Puts every enabled monitor on the scheduler at last switch + interval."""
+        now = self.scheduler.clock()
+        for m in self.service.monitors:
+            name = m['name']
+            cfg = self.service.get_config(name)
+            if cfg.get('enabled') and self.service.get_playlist(name):
+                # Never switched yet: due right away
+                last = self.last_switch.get(name)
+                self.scheduler.schedule(name, now if last is None else last + cfg.get('interval', 60))
+            else:
+                self.scheduler.cancel(name)
+
+    def on_config_changed(self, monitor_name, key):
+        if key == 'monitors':
+            self._topology_changed = True
+        elif key in ('fit_mode', 'span_bezel_px'):
+            self._refit = True
+        # The engine advances last_position itself; anything else may move a deadline
+        if key != 'last_position':
+            self.scheduler.wake()
+
+    def next_wallpapers(self):
+        """Predicts the images map after the next deadline: monitors due first advance by one."""
+        due = self.scheduler.due_times()
+        if not due:
+            return None
+
+        earliest = min(due.values())
+        next_map = dict(self.current_wallpapers)
+        for name, due_time in due.items():
+            # Deadlines within the scheduler slack switch together
+            if due_time - earliest <= self.scheduler.slack:
+                cfg = self.service.get_config(name)
+                images = self.service.get_playlist(name)
+                found = self.next_usable(images, playlist_cursor(images, cfg)) if images else None
+                if found:
+                    next_map[name] = found[1]
+        return next_map
+
+    def next_usable(self, images, cursor=None, include=False):
+        """
+        (cursor, path) of the first image after cursor (or at it, with include=True),
+        wrapping, that isn't known to be broken. Walks by position, so each step
+        costs an index seek, not a scan up to the cursor.
+        """
+        for cursor, path in itertools.islice(walk_playlist(images, cursor, include), MAX_SKIPPED_IMAGES):
+            if self.service.is_image_usable(path):
+                return cursor, path
+        return None
+
+
+def create_setter(backend, service, output_dir=None):
+    if backend == "system":
+        return SystemWallpaperSetter(service)
+    if backend == "file":
+        return FileOutputSetter(output_dir or os.path.join(os.getcwd(), "wallpaper_output"))
+    return NullWallpaperSetter()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dynamic Screen BG headless rotation engine")
+    parser.add_argument("--backend", choices=["system", "file", "none"], default="system",
+                        help="where rendered wallpapers go (default: system)")
+    parser.add_argument("--output", help="output directory for the file backend")
+    parser.add_argument("--once", action="store_true",
+                        help="render and apply the current wallpapers once, then exit")
+    parser.add_argument("--duration", type=float,
+                        help="stop after this many seconds")
+    parser.add_argument("--stats", help="write pipeline stats as JSON to this file on exit")
+    parser.add_argument("--platform", choices=["auto", "windows", "linux", "fake"], default="auto",
+                        help="monitor enumeration backend; 'fake' is a single 1080p display (default: auto)")
+    args = parser.parse_args(argv)
+
+    from platform_backend import create_backend
+    from wallpaper_service import get_service
+    service = get_service(create_backend(None if args.platform == "auto" else args.platform))
+    engine = RotationEngine(service, create_setter(args.backend, service, args.output))
+
+    if args.once:
+        for m in service.monitors:
+            cfg = service.get_config(m['name'])
+            images = service.get_playlist(m['name'])
+            if cfg.get('enabled') and images:
+                found = engine.next_usable(images, playlist_cursor(images, cfg), include=True)
+                if found:
+                    engine.current_wallpapers[m['name']] = found[1]
+        path = engine.apply_current()
+        # The process is about to exit; let the queued wallpaper land first
+        service.applier.wait_idle(30)
+        logger.info(f"Rendered {path}")
+        if args.stats:
+            service.dump_stats(args.stats)
+        return 0 if path else 1
+
+    engine.start()
+    try:
+        if args.duration:
+            time.sleep(args.duration)
+        else:
+            while True:
+                time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    engine.stop()
+    if args.stats:
+        service.dump_stats(args.stats)
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    raise SystemExit(main())
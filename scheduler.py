@@ -0,0 +1,119 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class DeadlineScheduler:
+    """
+    Heap of next-due times keyed by monitor name.
+
+    wait() sleeps exactly until the earliest deadline, or until wake() is called
+    (e.g. after a config change), so an idle rotation costs no periodic wakeups.
+    The clock is injectable so the schedule can be driven headless in tests.
+    """
+
+    def __init__(self, clock=time.monotonic, slack=0.5):
+        self.clock = clock
+        # Deadlines closer together than this fire in the same batch
+        self.slack = slack
+
+        self._heap = []                # (due, seq, key)
+        self._entries = {}             # key -> (due, seq) of the live heap entry
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._woken = False
+        self._stopped = False
+
+    def schedule(self, key, due):
+        """Sets (or moves) the deadline for key."""
+        with self._cond:
+            current = self._entries.get(key)
+            if current and current[0] == due:
+                return
+            seq = next(self._seq)
+            self._entries[key] = (due, seq)
+            heapq.heappush(self._heap, (due, seq, key))
+            self._cond.notify_all()
+
+    def cancel(self, key):
+        with self._cond:
+            # Heap entries are dropped lazily once they no longer match _entries
+            if self._entries.pop(key, None) is not None:
+                self._cond.notify_all()
+
+    def due_time(self, key):
+        with self._cond:
+            entry = self._entries.get(key)
+            return entry[0] if entry else None
+
+    def due_times(self):
+        with self._cond:
+            return {key: entry[0] for key, entry in self._entries.items()}
+
+    def next_due(self):
+        with self._cond:
+            return self._next_due_locked()
+
+    def pop_due(self, now=None):
+        """Removes and returns the keys due at now, plus any due within slack of them."""
+        with self._cond:
+            return self._pop_due_locked(self.clock() if now is None else now)
+
+    def wake(self):
+        """Interrupts wait() so the caller can re-read its configuration."""
+        with self._cond:
+            self._woken = True
+            self._cond.notify_all()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+    def wait(self):
+        """
+        Blocks until deadlines are due and returns their keys.
+        Returns [] after wake() and None once stop() has been called.
+        """
+        with self._cond:
+            while True:
+                if self._stopped:
+                    return None
+                if self._woken:
+                    self._woken = False
+                    return []
+                due = self._pop_due_locked(self.clock())
+                if due:
+                    return due
+                next_due = self._next_due_locked()
+                timeout = None if next_due is None else max(0.0, next_due - self.clock())
+                self._cond.wait(timeout)
+
+    def _next_due_locked(self):
+        while self._heap:
+            due, seq, key = self._heap[0]
+            if self._entries.get(key) == (due, seq):
+                return due
+            heapq.heappop(self._heap)
+        return None
+
+    def _pop_due_locked(self, now):
+        due_keys = []
+        next_due = self._next_due_locked()
+        if next_due is None or next_due > now:
+            return due_keys
+        # Something is due: take along deadlines that would fire within the slack anyway
+        horizon = now + self.slack
+        while True:
+            next_due = self._next_due_locked()
+            if next_due is None or next_due > horizon:
+                break
+            _, _, key = heapq.heappop(self._heap)
+            del self._entries[key]
+            due_keys.append(key)
+        return due_keys
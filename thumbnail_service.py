@@ -0,0 +1,128 @@
+import os
+import sys
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import features
+from tile_renderer import render_tile, file_signature
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (320, 200)
+
+
+def default_cache_dir():
+    """Per-user cache directory for generated thumbnails."""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "DynamicScreenBG", "thumbnails")
+
+
+class ThumbnailService:
+    """
+    Small cover-cropped previews for the image grid, generated on a background pool
+    and cached on disk. Cache files are keyed by path + mtime + size, so an edited
+    image gets a fresh thumbnail and an unchanged one is never decoded again.
+    """
+
+    def __init__(self, cache_dir=None, size=THUMBNAIL_SIZE, workers=2):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.size = size
+        self.workers = workers
+        # WebP is smaller and faster to load; not every Pillow build has it
+        if features.check("webp"):
+            self.format, self.extension = "WEBP", ".webp"
+        else:
+            self.format, self.extension = "JPEG", ".jpg"
+
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = {}   # cache path -> [callbacks]
+        self._known = {}     # source path -> cache path last produced for it
+
+    def cache_path(self, path):
+        """Thumbnail file for the current version of path, or None if path is missing."""
+        signature = file_signature(path)
+        if signature is None:
+            return None
+        key = f"{os.path.abspath(path)}|{signature[0]}|{signature[1]}|{self.size[0]}x{self.size[1]}"
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + self.extension)
+
+    def get(self, path):
+        """Returns the cached thumbnail path if it already exists, without generating it."""
+        thumb_path = self.cache_path(path)
+        if thumb_path and os.path.exists(thumb_path):
+            return thumb_path
+        return None
+
+    def request(self, path, callback):
+        """
+        Returns the cached thumbnail path right away when there is one. Otherwise
+        schedules generation and returns None; callback(path, thumb_path) runs on a
+        worker thread once it is ready (thumb_path is None if the image can't be read).
+        """
+        thumb_path = self.cache_path(path)
+        if thumb_path is None:
+            return None
+        if os.path.exists(thumb_path):
+            with self._lock:
+                self._known[os.path.abspath(path)] = thumb_path
+            return thumb_path
+
+        with self._lock:
+            if thumb_path in self._pending:
+                self._pending[thumb_path].append(callback)
+                return None
+            self._pending[thumb_path] = [callback]
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="thumbnail")
+            self._executor.submit(self._generate, path, thumb_path)
+        return None
+
+    def invalidate(self, path):
+        """Drops the thumbnail last generated for path (e.g. after the file changed)."""
+        with self._lock:
+            thumb_path = self._known.pop(os.path.abspath(path), None)
+        if thumb_path:
+            try:
+                os.remove(thumb_path)
+            except OSError:
+                pass
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _generate(self, path, thumb_path):
+        result = None
+        try:
+            os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+            tile = render_tile(path, self.size[0], self.size[1])
+            tmp_path = thumb_path + ".tmp"
+            tile.save(tmp_path, self.format, quality=80)
+            os.replace(tmp_path, thumb_path)
+            result = thumb_path
+            with self._lock:
+                previous = self._known.get(os.path.abspath(path))
+                self._known[os.path.abspath(path)] = thumb_path
+            if previous and previous != thumb_path:
+                try:
+                    os.remove(previous)
+                except OSError:
+                    pass
+        except Exception as e:
+            logger.error(f"Thumbnail error for {path}: {e}")
+
+        with self._lock:
+            callbacks = self._pending.pop(thumb_path, [])
+        for callback in callbacks:
+            try:
+                callback(path, result)
+            except Exception as e:
+                logger.error(f"Thumbnail callback error: {e}")
@@ -0,0 +1,279 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+def _tile_nbytes(tile):
+    return tile.width * tile.height * len(tile.getbands())
+
+
+class TileCache:
+    """
+    LRU cache of already fitted monitor tiles, bounded by bytes.
+
+    Keys are content addressed: (path, mtime_ns, file_size, (width, height), fit_mode),
+    so an edited or replaced file never hits a stale tile. Tiles evicted from memory
+    are optionally spilled to disk as BMP (cheap to encode and decode) and promoted
+    back on the next hit.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, spill_dir=None, max_spill_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+
+        self._tiles = OrderedDict()   # key -> PIL.Image
+        self._bytes = 0
+        self._spilled = OrderedDict() # key -> (file path, nbytes)
+        self._spilled_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._remove_orphaned_spills()
+
+    @staticmethod
+    def make_key(path, signature, width, height, fit_mode):
+        """signature is the (mtime_ns, size) tuple from tile_renderer.file_signature."""
+        return (os.path.abspath(path), signature[0], signature[1], (width, height), fit_mode)
+
+    def get(self, key):
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                self.hits += 1
+                return tile
+
+            spilled = self._spilled.pop(key, None)
+            if spilled is not None:
+                self._spilled_bytes -= spilled[1]
+
+        if spilled is not None:
+            tile = self._load_spilled(spilled[0])
+            if tile is not None:
+                with self._lock:
+                    self.hits += 1
+                self.put(key, tile)
+                return tile
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, tile):
+        nbytes = _tile_nbytes(tile)
+        if nbytes > self.max_bytes:
+            return
+
+        evicted = []
+        with self._lock:
+            old = self._tiles.pop(key, None)
+            if old is not None:
+                self._bytes -= _tile_nbytes(old)
+            self._tiles[key] = tile
+            self._bytes += nbytes
+
+            while self._bytes > self.max_bytes and self._tiles:
+                old_key, old_tile = self._tiles.popitem(last=False)
+                self._bytes -= _tile_nbytes(old_tile)
+                evicted.append((old_key, old_tile))
+
+        if self.spill_dir:
+            for old_key, old_tile in evicted:
+                self._spill(old_key, old_tile)
+
+    def invalidate_path(self, path):
+        """Drops every tile (in memory and on disk) rendered from the given file."""
+        path = os.path.abspath(path)
+        with self._lock:
+            for key in [k for k in self._tiles if k[0] == path]:
+                self._bytes -= _tile_nbytes(self._tiles.pop(key))
+            dropped = [self._spilled.pop(k) for k in [k for k in self._spilled if k[0] == path]]
+            for _, nbytes in dropped:
+                self._spilled_bytes -= nbytes
+        for file_path, _ in dropped:
+            self._remove_file(file_path)
+
+    def invalidate_size(self, width, height):
+        """Drops every tile rendered for a width x height monitor (e.g. after it was resized or unplugged)."""
+        size = (width, height)
+        with self._lock:
+            for key in [k for k in self._tiles if k[3] == size]:
+                self._bytes -= _tile_nbytes(self._tiles.pop(key))
+            dropped = [self._spilled.pop(k) for k in [k for k in self._spilled if k[3] == size]]
+            for _, nbytes in dropped:
+                self._spilled_bytes -= nbytes
+        for file_path, _ in dropped:
+            self._remove_file(file_path)
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self._bytes = 0
+            dropped = list(self._spilled.values())
+            self._spilled.clear()
+            self._spilled_bytes = 0
+        for file_path, _ in dropped:
+            self._remove_file(file_path)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'tiles': len(self._tiles),
+                'bytes': self._bytes,
+                'spilled_tiles': len(self._spilled),
+                'spilled_bytes': self._spilled_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits / total) if total else 0.0
+            }
+
+    def _spill_path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.spill_dir, f"{digest}.bmp")
+
+    def _spill(self, key, tile):
+        nbytes = _tile_nbytes(tile)
+        if nbytes > self.max_spill_bytes:
+            return
+        file_path = self._spill_path(key)
+        try:
+            tile.save(file_path, "BMP")
+        except Exception as e:
+            logger.error(f"Tile spill error: {e}")
+            return
+
+        dropped = []
+        with self._lock:
+            self._spilled[key] = (file_path, nbytes)
+            self._spilled_bytes += nbytes
+            while self._spilled_bytes > self.max_spill_bytes and self._spilled:
+                _, (old_path, old_bytes) = self._spilled.popitem(last=False)
+                self._spilled_bytes -= old_bytes
+                dropped.append(old_path)
+        for old_path in dropped:
+            self._remove_file(old_path)
+
+    def _remove_orphaned_spills(self):
+        """
+        Spill files from earlier runs are never looked up again (the index only lives in
+        memory, and exits through os._exit skip clear()), so they are dropped up front.
+        """
+        try:
+            names = os.listdir(self.spill_dir)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith(".bmp"):
+                self._remove_file(os.path.join(self.spill_dir, name))
+
+    def _load_spilled(self, file_path):
+        try:
+            with Image.open(file_path) as img:
+                tile = img.convert('RGB')
+        except Exception as e:
+            logger.error(f"Tile spill load error: {e}")
+            tile = None
+        self._remove_file(file_path)
+        return tile
+
+    @staticmethod
+    def _remove_file(file_path):
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+
+class PinnedTilePool:
+    """
+    Fitted tiles kept resident whether or not they are used, up to max_bytes: the
+    whole playlist of a fast slideshow, so its rotations never touch the decoder.
+    Nothing is evicted to make room; pin() refuses what doesn't fit and retain()
+    drops the tiles that left the playlists. Keys are TileCache keys.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._tiles = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._tiles
+
+    @property
+    def free_bytes(self):
+        with self._lock:
+            return self.max_bytes - self._bytes
+
+    def get(self, key):
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return tile
+
+    def pin(self, key, tile):
+        """Holds the tile; False if it would exceed the budget."""
+        nbytes = _tile_nbytes(tile)
+        with self._lock:
+            old = self._tiles.get(key)
+            if old is not None:
+                self._bytes -= _tile_nbytes(old)
+            if self._bytes + nbytes > self.max_bytes:
+                if old is not None:
+                    self._bytes += _tile_nbytes(old)
+                return False
+            self._tiles[key] = tile
+            self._bytes += nbytes
+            return True
+
+    def retain(self, keys):
+        """Drops every tile whose key is not in keys."""
+        with self._lock:
+            for key in [k for k in self._tiles if k not in keys]:
+                self._bytes -= _tile_nbytes(self._tiles.pop(key))
+
+    def invalidate_path(self, path):
+        """Drops the tiles of the given file. Returns True if there were any."""
+        path = os.path.abspath(path)
+        with self._lock:
+            keys = [k for k in self._tiles if k[0] == path]
+            for key in keys:
+                self._bytes -= _tile_nbytes(self._tiles.pop(key))
+        return bool(keys)
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'tiles': len(self._tiles),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'fill_ratio': (self._bytes / self.max_bytes) if self.max_bytes else 0.0,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits / total) if total else 0.0
+            }
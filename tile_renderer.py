@@ -0,0 +1,290 @@
+import os
+import sys
+import math
+import time
+import functools
+from collections import namedtuple
+from PIL import Image
+
+# How an image fills its monitor
+FIT_COVER = "cover"      # fill: scale to cover the monitor, center crop the overflow
+FIT_CONTAIN = "contain"  # fit: scale to fit inside the monitor, letterbox the rest
+FIT_STRETCH = "stretch"  # scale each axis to the monitor, ignoring the aspect ratio
+FIT_CENTER = "center"    # native size, centered; cropped where larger than the monitor
+FIT_SPAN = "span"        # one image across every span monitor (rendered as cover over the group)
+FIT_MODES = (FIT_COVER, FIT_CONTAIN, FIT_STRETCH, FIT_CENTER, FIT_SPAN)
+
+# box: source region to resample (floats, source pixels); size: what it is resampled to;
+# offset: where that lands on the tile. Whatever it leaves uncovered stays black.
+FitGeometry = namedtuple('FitGeometry', 'box size offset')
+
+EXIF_ORIENTATION = 0x0112
+
+# EXIF orientation -> transpose that makes the image upright (1 needs none)
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+def read_orientation(img):
+    """EXIF orientation of an opened image (1 when it has none)."""
+    try:
+        return int(img.getexif().get(EXIF_ORIENTATION, 1))
+    except Exception:
+        return 1
+
+
+def oriented_size(width, height, orientation):
+    """Displayed size of a width x height image with the given EXIF orientation."""
+    return (height, width) if orientation in (5, 6, 7, 8) else (width, height)
+
+
+def cover_size(src_width, src_height, width, height):
+    """Size the source must be resized to so it covers width x height."""
+    # Calculate target aspect ratio
+    target_ratio = width / height
+    img_ratio = src_width / src_height
+
+    if img_ratio > target_ratio:
+        # Image is wider, crop sides
+        new_height = height
+        new_width = int(new_height * img_ratio)
+    else:
+        # Image is taller, crop top/bottom
+        new_width = width
+        new_height = int(new_width / img_ratio)
+    return new_width, new_height
+
+
+def reduce_on_load(img, target_width, target_height):
+    """
+    Shrinks an opened image as cheaply as possible while keeping it at least
+    target_width x target_height, ahead of the high-quality resample.
+    JPEGs are decoded at 1/2, 1/4 or 1/8 scale by the decoder itself (draft mode),
+    which also cuts peak memory; anything still 2x or more too large is box-reduced.
+    """
+    if img.format == "JPEG":
+        img.draft(None, (target_width, target_height))
+
+    factor = min(img.width // target_width, img.height // target_height)
+    if factor >= 2:
+        img = reducible(img).reduce(factor)
+    return img
+
+
+def reducible(img):
+    """
+    The image in a mode Image.reduce() accepts: palette, 1-bit and 16-bit images
+    are converted (to what the RGB tile would become anyway), the rest pass as is.
+    """
+    if img.mode in ('P', 'PA'):
+        return img.convert('RGBA' if img.mode == 'PA' or 'transparency' in img.info else 'RGB')
+    if img.mode == '1':
+        return img.convert('L')
+    if img.mode.startswith('I;16'):
+        return img.convert('I')
+    return img
+
+
+def to_8bit(img):
+    """
+    16-bit (and 32-bit integer) images scaled to 8-bit grayscale. A plain
+    convert('L') or convert('RGB') clips them at 255, i.e. turns them white.
+    """
+    if img.mode == 'I' or img.mode.startswith('I;16'):
+        return img.convert('I').point(lambda v: v / 256).convert('L')
+    return img
+
+
+def cover_box(src_width, src_height, width, height):
+    """
+    The centered region of the source with the target's aspect ratio, i.e. the part
+    of the image that stays visible once it covers width x height.
+    Returns (left, top, right, bottom) as floats, in source pixels.
+    """
+    target_ratio = width / height
+    if src_width / src_height > target_ratio:
+        # Image is wider, crop sides
+        visible_width = src_height * target_ratio
+        left = (src_width - visible_width) / 2
+        return (left, 0.0, left + visible_width, float(src_height))
+    # Image is taller, crop top/bottom
+    visible_height = src_width / target_ratio
+    top = (src_height - visible_height) / 2
+    return (0.0, top, float(src_width), top + visible_height)
+
+
+@functools.lru_cache(maxsize=1024)
+def fit_geometry(src_width, src_height, width, height, fit_mode=FIT_COVER):
+    """
+    Placement of a src_width x src_height image on a width x height tile. Pure, so it
+    is computed once per (image size, monitor size, mode) and shared by every rotation.
+    """
+    full = (0.0, 0.0, float(src_width), float(src_height))
+    if fit_mode in (FIT_COVER, FIT_SPAN):
+        return FitGeometry(cover_box(src_width, src_height, width, height), (width, height), (0, 0))
+    if fit_mode == FIT_STRETCH:
+        return FitGeometry(full, (width, height), (0, 0))
+    if fit_mode == FIT_CONTAIN:
+        scale = min(width / src_width, height / src_height)
+        size = (max(1, round(src_width * scale)), max(1, round(src_height * scale)))
+    elif fit_mode == FIT_CENTER:
+        # Whole pixels only, so the tile is a plain crop with no resampling
+        size = (min(src_width, width), min(src_height, height))
+        left = (src_width - size[0]) // 2
+        top = (src_height - size[1]) // 2
+        full = (float(left), float(top), float(left + size[0]), float(top + size[1]))
+    else:
+        raise ValueError(f"Unknown fit mode: {fit_mode}")
+    return FitGeometry(full, size, ((width - size[0]) // 2, (height - size[1]) // 2))
+
+
+def decode_size(src_width, src_height, geometry):
+    """Smallest size the whole source can shrink to before the fit without losing detail in geometry.box."""
+    left, top, right, bottom = geometry.box
+    return (
+        max(1, math.ceil(src_width * geometry.size[0] / (right - left))),
+        max(1, math.ceil(src_height * geometry.size[1] / (bottom - top)))
+    )
+
+
+def fit_image(img, width, height, geometry, src_size=None, timings=None):
+    """
+    Applies a fit_geometry to an image. src_size is the size the geometry was planned
+    for, when img has been reduced since; the box is scaled to match.
+    timings, if given, receives the seconds spent in 'resize'.
+    """
+    start = time.perf_counter()
+    left, top, right, bottom = geometry.box
+    if src_size and src_size != img.size:
+        scale_x = img.width / src_size[0]
+        scale_y = img.height / src_size[1]
+        left, right = left * scale_x, right * scale_x
+        top, bottom = top * scale_y, bottom * scale_y
+    box = (left, top, right, bottom)
+    if (right - left, bottom - top) == geometry.size and all(v == int(v) for v in box):
+        fitted = img.crop(tuple(int(v) for v in box))
+    else:
+        fitted = img.resize(geometry.size, Image.Resampling.LANCZOS, box=box)
+    if geometry.size == (width, height):
+        tile = fitted
+    else:
+        tile = Image.new('RGB', (width, height), (0, 0, 0))
+        tile.paste(fitted if fitted.mode == 'RGB' else fitted.convert('RGB'), geometry.offset)
+    if timings is not None:
+        timings['resize'] = time.perf_counter() - start
+    return tile
+
+
+def fit_cover(img, width, height, timings=None):
+    """
+    Resamples only the visible region of the image (cover_box) straight to
+    width x height, so pixels that would be cropped away are never resampled.
+    timings, if given, receives the seconds spent in 'resize'.
+    """
+    start = time.perf_counter()
+    tile = img.resize(
+        (width, height), Image.Resampling.LANCZOS, box=cover_box(img.width, img.height, width, height)
+    )
+    if timings is not None:
+        timings['resize'] = time.perf_counter() - start
+    return tile
+
+
+def fit_cover_full(img, width, height, timings=None):
+    """
+    Resizes an image to cover width x height and center crops the overflow.
+    The pre-box path, kept for benchmarks; timings receives 'resize' and 'crop'.
+    """
+    new_width, new_height = cover_size(img.width, img.height, width, height)
+
+    start = time.perf_counter()
+    img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    resized = time.perf_counter()
+
+    # Center crop
+    left = (new_width - width) / 2
+    top = (new_height - height) / 2
+    right = (new_width + width) / 2
+    bottom = (new_height + height) / 2
+
+    tile = img.crop((left, top, right, bottom))
+    if timings is not None:
+        timings['resize'] = resized - start
+        timings['crop'] = time.perf_counter() - resized
+    return tile
+
+
+def render_tile(path, width, height, fit_mode=FIT_COVER, reduce=True, orientation=None, timings=None):
+    """
+    Opens an image from disk and returns an RGB tile of exactly width x height.
+    reduce=False decodes at full resolution (the pre-draft path, kept for benchmarks).
+    orientation is the EXIF orientation when already known (e.g. from the metadata
+    index); None reads it from the file.
+    timings, if given, receives seconds per stage: 'decode' (open, draft decode,
+    reduce, transpose) and 'resize'.
+    """
+    start = time.perf_counter()
+    with Image.open(path) as img:
+        if orientation is None:
+            orientation = read_orientation(img)
+        transpose = ORIENTATION_TRANSPOSE.get(orientation)
+        src_size = oriented_size(img.width, img.height, orientation)
+        geometry = fit_geometry(*src_size, width, height, fit_mode)
+        source = img
+        if reduce:
+            # Draft/reduce work on stored pixels, so plan with the sides swapped for 90° rotations
+            target = decode_size(*src_size, geometry)
+            if transpose is not None and orientation >= 5:
+                target = target[::-1]
+            source = reduce_on_load(img, *target)
+        source.load()
+        source = to_8bit(source)
+        if transpose is not None:
+            source = source.transpose(transpose)
+        if timings is not None:
+            timings['decode'] = time.perf_counter() - start
+        tile = fit_image(source, width, height, geometry, src_size, timings)
+    if tile.mode != 'RGB':
+        tile = tile.convert('RGB')
+    return tile
+
+
+def file_signature(path):
+    """Returns (mtime_ns, size) for a file, or None if it can't be stat'ed."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def attach_shared_memory(name):
+    """Attaches to an existing segment; the creating (parent) process owns and unlinks it."""
+    from multiprocessing import shared_memory
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Pool workers share the parent's resource tracker, so the extra registration is harmless
+    return shared_memory.SharedMemory(name=name)
+
+
+def render_tile_into_shared_memory(shm_name, path, width, height, fit_mode=FIT_COVER, orientation=None):
+    """
+    Process pool entry point: renders a tile straight into a parent-owned shared buffer.
+    Returns (tile size, stage timings).
+    """
+    timings = {}
+    tile = render_tile(path, width, height, fit_mode, orientation=orientation, timings=timings)
+    shm = attach_shared_memory(shm_name)
+    try:
+        data = tile.tobytes()
+        shm.buf[:len(data)] = data
+    finally:
+        shm.close()
+    return tile.size, timings
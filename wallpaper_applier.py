@@ -0,0 +1,104 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class WallpaperApplier:
+    """
+    Applies composites on a dedicated thread so the rotation never waits for the
+    desktop (SPIF_SENDCHANGE broadcasts to every top-level window and can hang on
+    a busy one).
+
+    The queue holds one path: a composite submitted while another is still waiting
+    replaces it, since only the newest one matters. busy_paths() lists the files the
+    worker still needs, so the renderer doesn't overwrite them in the meantime.
+    """
+
+    def __init__(self, apply_fn, metrics=None):
+        self.apply_fn = apply_fn
+        self.metrics = metrics
+
+        self._pending = None
+        self._in_flight = None
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+        self.applied = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def submit(self, path):
+        """Queues path for applying; a still-waiting older path is dropped."""
+        with self._cond:
+            if self._stopped:
+                return
+            if self._pending is not None:
+                self.dropped += 1
+                logger.debug(f"Dropped stale wallpaper {self._pending}")
+            self._pending = path
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="wallpaper-apply")
+                self._thread.start()
+            self._cond.notify_all()
+
+    def busy_paths(self):
+        with self._cond:
+            return {path for path in (self._pending, self._in_flight) if path}
+
+    def wait_idle(self, timeout=None):
+        """Blocks until nothing is queued or applying. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending is not None or self._in_flight is not None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def shutdown(self, timeout=10):
+        """Lets the last queued wallpaper land, then stops the worker."""
+        self.wait_idle(timeout)
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'applied': self.applied,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'pending': self._pending is not None
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stopped:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                path, self._pending = self._pending, None
+                self._in_flight = path
+
+            start = time.perf_counter()
+            try:
+                ok = self.apply_fn(path)
+            except Exception as e:
+                logger.error(f"Wallpaper apply error: {e}")
+                ok = False
+            elapsed = time.perf_counter() - start
+            if self.metrics is not None:
+                self.metrics.record('apply', elapsed)
+
+            with self._cond:
+                self._in_flight = None
+                if ok:
+                    self.applied += 1
+                else:
+                    self.failed += 1
+                self._cond.notify_all()
@@ -0,0 +1,149 @@
+import io
+import os
+import struct
+import time
+import statistics
+from PIL import Image
+
+# Output formats SystemParametersInfoW accepts for SPI_SETDESKWALLPAPER.
+# BMP is applied as-is; JPEG/PNG are transcoded by the shell.
+FORMAT_BMP = "bmp"
+FORMAT_JPEG = "jpeg"
+FORMAT_PNG = "png"
+FORMAT_AUTO = "auto"
+
+OUTPUT_FORMATS = {
+    FORMAT_BMP: {'pil_format': "BMP", 'extension': ".bmp"},
+    FORMAT_JPEG: {'pil_format': "JPEG", 'extension': ".jpg"},
+    FORMAT_PNG: {'pil_format': "PNG", 'extension': ".png"},
+}
+
+# Formats 'auto' chooses between: lossless only, JPEG has to be picked explicitly
+AUTO_FORMATS = (FORMAT_BMP, FORMAT_PNG)
+
+DEFAULT_JPEG_QUALITY = 95
+DEFAULT_PNG_COMPRESS_LEVEL = 1
+
+
+def encoder_options(fmt, app_settings):
+    """Pillow save() keyword arguments for a format, taken from app settings."""
+    if fmt == FORMAT_JPEG:
+        return {'quality': app_settings.get('jpeg_quality', DEFAULT_JPEG_QUALITY), 'subsampling': 0}
+    if fmt == FORMAT_PNG:
+        return {'compress_level': app_settings.get('png_compress_level', DEFAULT_PNG_COMPRESS_LEVEL)}
+    return {}
+
+
+def output_path_for(fmt, base_path):
+    """base_path without extension -> path with the format's extension."""
+    return base_path + OUTPUT_FORMATS[fmt]['extension']
+
+
+def encode_wallpaper(canvas, path, fmt, app_settings):
+    """Writes the canvas to path in the given format. Returns the encode time in seconds."""
+    start = time.perf_counter()
+    canvas.save(path, OUTPUT_FORMATS[fmt]['pil_format'], **encoder_options(fmt, app_settings))
+    return time.perf_counter() - start
+
+
+def measure_encoders(canvas, app_settings, formats=None, runs=1):
+    """
+    Encodes the canvas runs times per format into memory and returns
+    { format: {'seconds': float, 'bytes': int} }, seconds being the median run.
+    """
+    results = {}
+    for fmt in formats or OUTPUT_FORMATS:
+        seconds = []
+        for _ in range(runs):
+            buffer = io.BytesIO()
+            start = time.perf_counter()
+            canvas.save(buffer, OUTPUT_FORMATS[fmt]['pil_format'], **encoder_options(fmt, app_settings))
+            seconds.append(time.perf_counter() - start)
+        results[fmt] = {
+            'seconds': round(statistics.median(seconds), 4),
+            'bytes': buffer.tell()
+        }
+    return results
+
+
+def fastest_format(timings):
+    return min(timings, key=lambda fmt: timings[fmt]['seconds'])
+
+
+def remove_stale_outputs(base_path, keep_path):
+    """Deletes outputs left behind in other formats after the format changed."""
+    for fmt in OUTPUT_FORMATS:
+        path = output_path_for(fmt, base_path)
+        if path != keep_path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def bmp_row_stride(width):
+    """Bytes per 24-bit BMP row (rows are padded to a multiple of 4)."""
+    return (width * 3 + 3) & ~3
+
+
+def write_bmp_bands(path, width, height, regions, fetch, band_rows, timings=None):
+    """
+    Writes a width x height 24-bit BMP without ever holding the whole image.
+    regions: list of (x, y, width, height) placed on a black background.
+    fetch(indexes) returns {index: tile or None} for the regions a band reaches
+    first; each tile is dropped again after the last band it covers, so only the
+    tiles of one row of regions are held at a time.
+    The file is pre-sized (unwritten bytes read as zero, i.e. black) and then
+    filled one band of band_rows rows at a time; bands no region touches are
+    never composed at all. Returns the number of bands written.
+    timings, if given, receives the total seconds spent in 'paste' and 'write'.
+    """
+    stride = bmp_row_stride(width)
+    header_size = 14 + 40
+    image_size = stride * height
+    header = struct.pack(
+        "<2sIHHI", b"BM", header_size + image_size, 0, 0, header_size
+    ) + struct.pack(
+        # Positive height: rows are stored bottom-up
+        "<IiiHHIIiiII", 40, width, height, 1, 24, 0, image_size, 2835, 2835, 0, 0
+    )
+
+    bands = 0
+    paste_seconds = write_seconds = 0.0
+    live = {}
+    fetched = set()
+    with open(path, "wb") as f:
+        f.write(header)
+        f.truncate(header_size + image_size)
+        for top in range(0, height, band_rows):
+            bottom = min(top + band_rows, height)
+            touching = [i for i, (_, y, _, h) in enumerate(regions) if y < bottom and y + h > top]
+            new = [i for i in touching if i not in fetched]
+            if new:
+                fetched.update(new)
+                live.update(fetch(new))
+            touching = [(regions[i][0], regions[i][1], live[i]) for i in touching if live.get(i) is not None]
+            for i in [i for i in live if regions[i][1] + regions[i][3] <= bottom]:
+                del live[i]
+            if not touching:
+                continue
+            start = time.perf_counter()
+            band = Image.new('RGB', (width, bottom - top), (0, 0, 0))
+            for x, y, tile in touching:
+                # Only the rows of the tile that fall inside this band
+                crop_top = max(0, top - y)
+                crop_bottom = min(tile.height, bottom - y)
+                band.paste(tile.crop((0, crop_top, tile.width, crop_bottom)), (x, y + crop_top - top))
+            # BGR, padded stride, bottom-up: exactly this band's bytes in the file
+            data = band.tobytes('raw', 'BGR', stride, -1)
+            del band
+            pasted = time.perf_counter()
+            f.seek(header_size + (height - bottom) * stride)
+            f.write(data)
+            paste_seconds += pasted - start
+            write_seconds += time.perf_counter() - pasted
+            bands += 1
+    if timings is not None:
+        timings['paste'] = paste_seconds
+        timings['write'] = write_seconds
+    return bands
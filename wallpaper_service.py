@@ -1,50 +1,195 @@
 import os
-import ctypes
 import json
 import logging
-from ctypes import wintypes
-from PIL import Image
+import atexit
 import tempfile
+import time
+import threading
+import functools
+import itertools
+from tile_cache import TileCache, PinnedTilePool
+from library_store import LibraryStore, Playlist, walk_playlist, playlist_cursor
+from folder_scanner import FolderScanner, CombinedPlaylist, IMAGE_PATTERNS
+from tile_renderer import FIT_COVER, FIT_SPAN, FIT_MODES, file_signature
+from thumbnail_service import ThumbnailService
+from image_metadata import MetadataIndex
+from fs_watcher import create_watcher, InotifyWatcher, DELETED, MOVED, MODIFIED
+from render_pool import TileRenderPool, default_render_workers
+from wallpaper_encoder import (
+    FORMAT_AUTO, FORMAT_BMP, OUTPUT_FORMATS, AUTO_FORMATS, encode_wallpaper, measure_encoders, fastest_format,
+    output_path_for, remove_stale_outputs, write_bmp_bands, bmp_row_stride
+)
+from metrics import PipelineMetrics, peak_rss_kb, dump_json
+from platform_backend import create_backend, topology_fingerprint
+from compositor import create_canvas, COMPOSITOR_PIL
+from wallpaper_applier import WallpaperApplier
 
 # Setup Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# WinAPI Constants & Types
-user32 = ctypes.windll.user32
-SPI_SETDESKWALLPAPER = 0x0014
-SPIF_UPDATEINIFILE = 0x01
-SPIF_SENDCHANGE = 0x02
-
-class MONITORINFOEX(ctypes.Structure):
-    _fields_ = [
-        ("cbSize", wintypes.DWORD),
-        ("rcMonitor", wintypes.RECT),
-        ("rcWork", wintypes.RECT),
-        ("dwFlags", wintypes.DWORD),
-        ("szDevice", wintypes.WCHAR * 32)
-    ]
+# Encodes per format when 'auto' times the output formats; the median counts
+AUTO_FORMAT_RUNS = 3
+
+# Composite files written in turn: one being applied, one queued behind it and one to render into
+OUTPUT_SLOTS = 3
+
+# Config changes that alter which tiles the pinned pool should hold
+PINNED_POOL_KEYS = ('images', 'folders', 'enabled', 'fit_mode', 'span_bezel_px', 'monitors')
+
+
+@functools.lru_cache(maxsize=16)
+def span_layout(rects, bezel=0):
+    """
+    Virtual canvas one image is fitted to when it spans several monitors.
+    rects: ((name, (left, top, right, bottom)), ...) of the span monitors.
+    Every monitor edge to the left of / above a monitor pushes it bezel pixels further,
+    so the image runs on behind the frames instead of jumping across them.
+    Returns ((width, height), {name: (x, y) of the monitor in that canvas}).
+    """
+    rights = {rect[2] for _, rect in rects}
+    bottoms = {rect[3] for _, rect in rects}
+    placed = {
+        name: (rect[0] + bezel * sum(1 for r in rights if r <= rect[0]),
+               rect[1] + bezel * sum(1 for b in bottoms if b <= rect[1]),
+               rect[2] - rect[0], rect[3] - rect[1])
+        for name, rect in rects
+    }
+    min_x = min(x for x, _, _, _ in placed.values())
+    min_y = min(y for _, y, _, _ in placed.values())
+    size = (max(x + w for x, _, w, _ in placed.values()) - min_x,
+            max(y + h for _, y, _, h in placed.values()) - min_y)
+    return size, {name: (x - min_x, y - min_y) for name, (x, y, _, _) in placed.items()}
 
 class WallpaperService:
-    def __init__(self):
+    def __init__(self, backend=None):
+        # Monitor enumeration and wallpaper application (WinAPI, Linux desktop or fake)
+        self.backend = backend or create_backend()
         self.monitors = []
+        self.topology = None           # fingerprint of self.monitors, see detect_monitors
+        self._topology_hint = None
+        self._topology_lock = threading.Lock()
+        self._monitor_watch_thread = None
         self.config_file = "monitor_config.json"
         
         self.log_callback = None
+        self._show_logs = None      # cached 'show_logs' setting, reset by update_app_settings
+        self._config_listeners = []
+        
+        # Write-behind config persistence, see save_configs / flush_configs
+        self.save_delay = 1.0
+        self._save_timer = None
+        self._config_dirty = False
+        self._save_lock = threading.RLock()
+        atexit.register(self.flush_configs)
         
-        # Load config dictionary: { "monitor_name": { "images": [], "interval": 60, "enabled": True, "last_index": 0 } }
+        # Load config dictionary: { "monitor_name": { "interval": 60, "enabled": True, "last_position": None } }
         self.configs = self.load_configs()
         
+        # Playlists live in SQLite next to the config; get_config exposes them as 'images'
+        self.library_file = os.path.splitext(self.config_file)[0] + ".db"
+        self.library = LibraryStore(self.library_file)
+        self.migrate_playlists()
+        app_settings = self.get_app_settings()
+        
+        # Size, orientation and decode health of every playlist image, built in the background
+        self.metadata = MetadataIndex(
+            self.library,
+            workers=app_settings.get('metadata_workers', 2),
+            on_broken=lambda path, error: self._log(f"Unreadable image {path}: {error}")
+        )
+        atexit.register(self.metadata.shutdown)
+        self.metadata.index_many(self.library.all_paths())
+        
+        # Folder sources are indexed incrementally on a background thread
+        self.folder_scanner = FolderScanner(on_change=self._on_folder_files_changed)
+        for name, cfg in self.configs.items():
+            if name != 'app_settings' and isinstance(cfg, dict) and cfg.get('folders'):
+                self.folder_scanner.set_sources(name, cfg['folders'])
+        
+        # Fitted monitor tiles, so a rotation only resizes the monitors whose image changed
+        spill_dir = None
+        if app_settings.get('tile_cache_spill', False):
+            spill_dir = os.path.join(tempfile.gettempdir(), "dynamic_screen_bg_tiles")
+        self.tile_cache = TileCache(
+            max_bytes=app_settings.get('tile_cache_mb', 256) * 1024 * 1024,
+            spill_dir=spill_dir
+        )
+        
+        # Cache misses render on worker processes; render_workers <= 1 keeps everything in-process
+        self.render_pool = TileRenderPool(app_settings.get('render_workers', default_render_workers()))
+        atexit.register(self.render_pool.shutdown)
+        
+        # Grid previews; the worker pool only starts once the UI asks for a thumbnail
+        self.thumbnails = ThumbnailService()
+        atexit.register(self.thumbnails.shutdown)
+        
+        # Keeps playlists, tiles and thumbnails in sync with the files on disk
+        self.watcher = None
+        if app_settings.get('watch_files', True):
+            self.watcher = create_watcher(self._on_file_events, app_settings.get('watch_poll_interval', 30))
+            if isinstance(self.watcher, InotifyWatcher):
+                # Events cover the folders already; the periodic scan is only a safety net
+                self.folder_scanner.refresh_interval = 3600
+            threading.Thread(target=self._start_watcher, daemon=True, name="fs-watcher-setup").start()
+            atexit.register(self.watcher.stop)
+        
+        # Rolling per-stage timings, see get_stats
+        self.metrics = PipelineMetrics()
+        
+        # Wallpapers are applied on their own thread, newest composite first, see set_system_wallpaper
+        self.applier = WallpaperApplier(self._apply_system_wallpaper, metrics=self.metrics)
+        atexit.register(self.applier.shutdown)
+        
+        # Persistent composite canvas and the (path, signature) painted into each monitor region
+        self._canvas = None
+        self._canvas_layout = None
+        self._canvas_origin = None
+        self._canvas_compositor = None
+        self._canvas_images = {}
+        self._dirty_monitors = set()
+        self._render_lock = threading.Lock()
+        self._format_thread = None
+        
+        # Outputs rotate over OUTPUT_SLOTS files so a render never overwrites one still being applied
+        self._output_slot = 0
+        
+        # Look-ahead render: (images_map, signatures, output_path) of the next composite
+        self._prerendered = None
+        self._prerender_thread = None
+        
+        # Opt-in: every playlist tile held resident, see set_pinned_pool
+        self.pinned_pool = None
+        self._pool_thread = None
+        self._pool_rewarm = False
+        self._pool_lock = threading.Lock()
+        
         # Initialize monitors
         self.detect_monitors()
+        
+        self.add_config_listener(self._on_pool_config_changed)
+        if app_settings.get('pinned_pool', False):
+            self.set_pinned_pool(True)
 
     def set_log_callback(self, callback):
         self.log_callback = callback
         
+    def add_config_listener(self, callback):
+        """callback(monitor_name, key) runs after a monitor config changes."""
+        self._config_listeners.append(callback)
+
+    def _notify_config_changed(self, monitor_name, key):
+        for callback in list(self._config_listeners):
+            try:
+                callback(monitor_name, key)
+            except Exception as e:
+                logger.error(f"Config listener error: {e}")
+
     def _log(self, message):
         # Only log if logging is enabled in app settings
-        app_settings = self.get_app_settings()
-        if app_settings.get('show_logs', True):
+        if self._show_logs is None:
+            self._show_logs = self.get_app_settings().get('show_logs', True)
+        if self._show_logs:
             logger.info(message)
             if self.log_callback:
                 self.log_callback(message)
@@ -63,11 +208,36 @@ class WallpaperService:
         return {'app_settings': {'language': 'tr', 'show_logs': True}}
 
     def save_configs(self):
-        try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.configs, f, indent=4, ensure_ascii=False)
-        except Exception as e:
-            logger.error(f"Config save error: {e}")
+        """Schedules a write; mutations within save_delay seconds are coalesced into one."""
+        with self._save_lock:
+            self._config_dirty = True
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.save_delay, self.flush_configs)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush_configs(self):
+        """Writes pending config changes now (temp file + rename, so a crash never truncates it)."""
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._config_dirty:
+                return
+            self._config_dirty = False
+            tmp_path = self.config_file + ".tmp"
+            try:
+                data = json.dumps(self.configs, indent=4, ensure_ascii=False)
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.config_file)
+            except Exception as e:
+                logger.error(f"Config save error: {e}")
+                # Keep the changes pending so the next mutation or shutdown retries
+                self._config_dirty = True
     
     def get_app_settings(self):
         """Get global app settings"""
@@ -78,184 +248,814 @@ class WallpaperService:
         if 'app_settings' not in self.configs:
             self.configs['app_settings'] = {}
         self.configs['app_settings'][key] = value
+        self._show_logs = None
         self.save_configs()
         self._log(f"App setting updated: {key} = {value}")
 
-    def detect_monitors(self):
-        """Detects monitors using WinAPI and stores their rects."""
-        self.monitors = []
-        
-        def enum_monitor_callback(hmonitor, hdc, rect, data):
-            info = MONITORINFOEX()
-            info.cbSize = ctypes.sizeof(MONITORINFOEX)
-            user32.GetMonitorInfoW(hmonitor, ctypes.byref(info))
+    def set_output_format(self, fmt, jpeg_quality=None, png_compress_level=None):
+        """Selects the stitched wallpaper format: 'auto', 'bmp', 'jpeg' or 'png'."""
+        if fmt != FORMAT_AUTO and fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {fmt}")
+        if jpeg_quality is not None:
+            self.configs.setdefault('app_settings', {})['jpeg_quality'] = int(jpeg_quality)
+        if png_compress_level is not None:
+            self.configs.setdefault('app_settings', {})['png_compress_level'] = int(png_compress_level)
+        # Encoder options changed, so earlier auto measurements no longer apply
+        self.configs.setdefault('app_settings', {}).pop('output_format_auto', None)
+        self.update_app_settings('output_format', fmt)
+
+    def resolve_output_format(self, canvas, painted=True):
+        """
+        Returns the configured output format. In 'auto' mode the AUTO_FORMATS are
+        timed on a copy of the canvas in the background and the fastest is kept until
+        the canvas size changes; until then BMP is used. painted=False (no image on
+        the canvas yet) doesn't measure: a blank canvas compresses unlike any real wallpaper.
+        """
+        app_settings = self.get_app_settings()
+        fmt = app_settings.get('output_format', FORMAT_AUTO)
+        if fmt in OUTPUT_FORMATS:
+            return fmt
+
+        auto = app_settings.get('output_format_auto')
+        if auto and auto.get('format') in AUTO_FORMATS and tuple(auto.get('canvas', ())) == canvas.size:
+            return auto['format']
+        if painted and not (self._format_thread and self._format_thread.is_alive()):
+            self._format_thread = threading.Thread(
+                target=self._measure_output_formats, args=(canvas.copy(), app_settings),
+                daemon=True, name="format-measure"
+            )
+            self._format_thread.start()
+        return FORMAT_BMP
+
+    def _measure_output_formats(self, canvas, app_settings):
+        try:
+            timings = measure_encoders(canvas, app_settings, AUTO_FORMATS, runs=AUTO_FORMAT_RUNS)
+        except Exception as e:
+            logger.error(f"Output format measurement error: {e}")
+            return
+        fmt = fastest_format(timings)
+        self.configs.setdefault('app_settings', {})['output_format_auto'] = {
+            'format': fmt,
+            'canvas': list(canvas.size),
+            'timings': timings
+        }
+        self.save_configs()
+        summary = ", ".join(f"{name}={t['seconds']:.3f}s" for name, t in timings.items())
+        self._log(f"Output format auto-selected: {fmt} ({summary})")
+
+    def detect_monitors(self, force=False):
+        """
+        Refreshes self.monitors from the platform backend. The backend's cheap topology
+        hint is checked first, so a full enumeration only runs when something may have
+        changed (or with force=True). Returns True if the monitor set changed.
+        """
+        with self._topology_lock:
+            hint = self.backend.topology_hint()
+            if not force and self.topology is not None and hint is not None and hint == self._topology_hint:
+                return False
+            monitors = self.backend.enumerate_monitors()
+            self._topology_hint = hint
+            fingerprint = topology_fingerprint(monitors)
+            if fingerprint == self.topology:
+                return False
             
-            name = info.szDevice
-            r = info.rcMonitor
-            width = r.right - r.left
-            height = r.bottom - r.top
+            first_detection = self.topology is None
+            previous = {m['name']: m for m in self.monitors}
+            self.monitors = monitors
+            self.topology = fingerprint
             
-            self.monitors.append({
-                'name': name,
-                'handle': hmonitor,
-                'rect': (r.left, r.top, r.right, r.bottom), # Left, Top, Right, Bottom
-                'width': width,
-                'height': height,
-                'x': r.left,
-                'y': r.top
-            })
-            return True
-
-        ENUM_MONITOR_PROC = ctypes.WINFUNCTYPE(ctypes.c_bool, ctypes.c_ulong, ctypes.c_ulong, ctypes.POINTER(wintypes.RECT), ctypes.c_double)
-        user32.EnumDisplayMonitors(None, None, ENUM_MONITOR_PROC(enum_monitor_callback), 0)
+            # Ensure config entries exist for all detected monitors; only new ones need a write
+            added = False
+            for m in self.monitors:
+                if m['name'] not in self.configs:
+                    self.configs[m['name']] = {
+                        "interval": 60,
+                        "enabled": False,
+                        "last_position": None
+                    }
+                    added = True
+            if added:
+                self.save_configs()
+            changed = self._on_topology_changed(previous)
         
-        # Ensure config entries exist for all detected monitors
-        for m in self.monitors:
-            if m['name'] not in self.configs:
-                self.configs[m['name']] = {
-                    "images": [],
-                    "interval": 60,
-                    "enabled": False,
-                    "last_index": 0
-                }
-        self.save_configs()
-        self._log(f"Detected {len(self.monitors)} monitors.")
+        if first_detection:
+            self._log(f"Detected {len(self.monitors)} monitors.")
+        else:
+            self._log(f"Monitor layout changed ({', '.join(sorted(changed))}): {len(self.monitors)} monitors.")
+            self._notify_config_changed(None, 'monitors')
+        return True
+
+    def _on_topology_changed(self, previous):
+        """Drops render state tied to monitors whose geometry changed. Returns their names."""
+        current = {m['name']: m for m in self.monitors}
+        changed = [
+            name for name in set(previous) | set(current)
+            if (previous.get(name) or {}).get('rect') != (current.get(name) or {}).get('rect')
+        ]
+        # Tiles of a size no monitor has any more only take cache space
+        sizes = {(m['width'], m['height']) for m in self.monitors}
+        for name in changed:
+            old = previous.get(name)
+            if old and (old['width'], old['height']) not in sizes:
+                self.tile_cache.invalidate_size(old['width'], old['height'])
+        # The look-ahead composite was laid out for the old topology
+        self._prerendered = None
+        return changed
+
+    def start_monitor_watch(self, interval=None):
+        """
+        Polls the backend's topology hint in the background to pick up hot-plugged displays.
+        Backends without a cheap hint aren't polled, since every check would be a full
+        enumeration; their changes are picked up by detect_monitors(force=True).
+        """
+        if self._monitor_watch_thread and self._monitor_watch_thread.is_alive():
+            return
+        if self.backend.topology_hint() is None:
+            logger.info(f"No topology hint on the {self.backend.name} backend; monitors are not polled")
+            return
+        interval = interval or self.get_app_settings().get('monitor_poll_interval', 3)
+        self._monitor_watch_thread = threading.Thread(
+            target=self._run_monitor_watch, args=(interval,), daemon=True, name="monitor-watch"
+        )
+        self._monitor_watch_thread.start()
+
+    def _run_monitor_watch(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.detect_monitors()
+            except Exception as e:
+                logger.error(f"Monitor detection error: {e}")
+
+    def migrate_playlists(self):
+        """Moves playlists still stored as JSON lists (older configs) into the library store."""
+        migrated = False
+        for name, cfg in self.configs.items():
+            if name == 'app_settings' or not isinstance(cfg, dict):
+                continue
+            images = cfg.get('images')
+            if isinstance(images, list):
+                # replace() is idempotent, so a crash before the JSON flush just migrates again
+                self.library.replace(name, images)
+                del cfg['images']
+                migrated = True
+                logger.info(f"Migrated {len(images)} images of {name} to the library store")
+        if migrated:
+            self.save_configs()
+            self.flush_configs()
+
+    def _start_watcher(self):
+        # Registering recursive watches walks the folder trees, so it stays off the startup path
+        try:
+            for cfg in list(self.configs.values()):
+                if isinstance(cfg, dict):
+                    for folder in cfg.get('folders', []):
+                        self.watcher.watch_dir(folder['path'], folder.get('recursive', True))
+            self.watcher.watch_files(self.library.all_paths())
+            self.watcher.start()
+        except Exception as e:
+            logger.error(f"File watcher setup error: {e}")
+
+    def _on_file_events(self, events):
+        """Applies (kind, path, new_path) events from the file watcher."""
+        changed = set()
+        unpinned = False
+        for kind, path, new_path in events:
+            if kind in (DELETED, MOVED, MODIFIED):
+                self.tile_cache.invalidate_path(path)
+                self.thumbnails.invalidate(path)
+                if self.pinned_pool is not None and self.pinned_pool.invalidate_path(path):
+                    unpinned = True
+            if kind == DELETED:
+                self.metadata.remove(path)
+                monitors = self.library.remove_path_everywhere(path)
+                if monitors:
+                    self._log(f"Removed missing image from {len(monitors)} playlist(s): {path}")
+                changed.update(monitors)
+            elif kind == MOVED:
+                self.metadata.remove(path)
+                monitors = self.library.rename_path(path, new_path)
+                if monitors:
+                    self.metadata.index_many([new_path])
+                changed.update(monitors)
+                self.folder_scanner.update_file(new_path)
+            elif kind == MODIFIED and self.library.get_metadata(path) is not None:
+                self.metadata.index_many([path])
+            # Folder sources pick the file up on the scanner thread (files outside them are ignored)
+            self.folder_scanner.update_file(path)
+
+        for monitor_name in changed:
+            self._notify_config_changed(monitor_name, 'images')
+        # Playlist and folder changes rewarm through their config notifications; a changed file only if it was pinned
+        if unpinned:
+            self.warm_pinned_pool()
+
+    def _on_folder_files_changed(self, monitor_name):
+        self.metadata.index_many(self.folder_scanner.files(monitor_name))
+        self._notify_config_changed(monitor_name, 'folders')
+
+    def is_image_usable(self, path):
+        """False for images known to be missing or undecodable, so rotation can skip them."""
+        return self.metadata.is_usable(path)
 
     def get_config(self, monitor_name):
-        return self.configs.get(monitor_name, {})
+        cfg = self.configs.get(monitor_name)
+        if cfg is None:
+            return {}
+        # 'images' is a live, read-only view over the library store
+        return dict(cfg, images=Playlist(self.library, monitor_name))
 
     def update_config(self, monitor_name, key, value):
         if monitor_name in self.configs:
+            if key == 'images':
+                self.library.replace(monitor_name, value)
+                self._notify_config_changed(monitor_name, key)
+                self._log(f"Updated {monitor_name}: {len(value)} images")
+                return
             self.configs[monitor_name][key] = value
             self.save_configs()
+            self._notify_config_changed(monitor_name, key)
             self._log(f"Updated {monitor_name}: {key} -> {value}")
 
+    def get_playlist(self, monitor_name):
+        """Images the rotation cycles through: explicit images, then the folder index."""
+        images = Playlist(self.library, monitor_name)
+        folder_files = self.folder_scanner.files(monitor_name)
+        if not folder_files:
+            return images
+        return CombinedPlaylist(images, folder_files)
+
+    def get_folders(self, monitor_name):
+        return self.configs.get(monitor_name, {}).get('folders', [])
+
+    def add_folder(self, monitor_name, path, recursive=True, patterns=None):
+        """Adds a folder source; its images are picked up by the background scanner."""
+        if monitor_name not in self.configs:
+            return False
+        folders = self.configs[monitor_name].setdefault('folders', [])
+        path = os.path.normpath(path)
+        if any(f['path'] == path for f in folders):
+            return False
+        folders.append({'path': path, 'recursive': recursive, 'patterns': patterns or list(IMAGE_PATTERNS)})
+        self.save_configs()
+        self.folder_scanner.set_sources(monitor_name, folders)
+        if self.watcher:
+            self.watcher.watch_dir(path, recursive)
+        self._log(f"Added folder to {monitor_name}: {path}")
+        return True
+
+    def remove_folder(self, monitor_name, path):
+        folders = self.configs.get(monitor_name, {}).get('folders', [])
+        remaining = [f for f in folders if f['path'] != os.path.normpath(path)]
+        if len(remaining) == len(folders):
+            return False
+        self.configs[monitor_name]['folders'] = remaining
+        self.save_configs()
+        self.folder_scanner.set_sources(monitor_name, remaining)
+        if self.watcher and not any(
+            f['path'] == os.path.normpath(path)
+            for cfg in self.configs.values() if isinstance(cfg, dict)
+            for f in cfg.get('folders', [])
+        ):
+            self.watcher.unwatch_dir(path)
+        self._notify_config_changed(monitor_name, 'folders')
+        self._log(f"Removed folder from {monitor_name}: {path}")
+        return True
+
     def add_image(self, monitor_name, path):
-        if monitor_name in self.configs and path not in self.configs[monitor_name]['images']:
-            self.configs[monitor_name]['images'].append(path)
-            self.save_configs()
+        if monitor_name in self.configs and self.library.append(monitor_name, path):
+            if self.watcher:
+                self.watcher.watch_files([path])
+            self.metadata.index_many([path])
+            self._notify_config_changed(monitor_name, 'images')
             self._log(f"Added image to {monitor_name}")
             return True
         return False
 
+    def add_images(self, monitor_name, paths):
+        """Adds several images in one transaction. Returns how many were new."""
+        if monitor_name not in self.configs:
+            return 0
+        added = self.library.append_many(monitor_name, paths)
+        if added:
+            if self.watcher:
+                self.watcher.watch_files(paths)
+            self.metadata.index_many(paths)
+            self._notify_config_changed(monitor_name, 'images')
+            self._log(f"Added {added} images to {monitor_name}")
+        return added
+
     def remove_image(self, monitor_name, path):
-         if monitor_name in self.configs and path in self.configs[monitor_name]['images']:
-            self.configs[monitor_name]['images'].remove(path)
-            self.save_configs()
+         if monitor_name in self.configs and self.library.remove(monitor_name, path):
+            self._notify_config_changed(monitor_name, 'images')
             self._log(f"Removed image from {monitor_name}")
             return True
          return False
 
     def move_image(self, monitor_name, index, direction):
         if monitor_name in self.configs:
-            images = self.configs[monitor_name]['images']
-            new_index = index + direction
-            if 0 <= new_index < len(images):
-                images[index], images[new_index] = images[new_index], images[index]
-                self.save_configs()
+            if self.library.move(monitor_name, index, index + direction):
+                self._notify_config_changed(monitor_name, 'images')
                 self._log(f"Reordered images in {monitor_name}")
                 return True
         return False
         
     def shift_image(self, monitor_name, src_index, dest_index):
         if monitor_name in self.configs:
-            images = self.configs[monitor_name]['images']
-            if 0 <= src_index < len(images) and 0 <= dest_index < len(images):
-                item = images.pop(src_index)
-                images.insert(dest_index, item)
-                self.save_configs()
+            if self.library.move(monitor_name, src_index, dest_index):
+                self._notify_config_changed(monitor_name, 'images')
                 self._log(f"Moved image {src_index} -> {dest_index}")
                 return True
         return False
 
+    def get_tiles(self, jobs, monitors=None):
+        """
+        jobs: list of (path, width, height, fit_mode).
+        Returns tiles (or the exception per failed job) in order; cache misses render
+        together on the render pool. monitors (names aligned with jobs) attribute the
+        render timings per monitor.
+        """
+        results = [None] * len(jobs)
+        misses = []
+        duplicates = []     # (index, index of the identical miss that renders for both)
+        missed_keys = {}
+        pool = self.pinned_pool
+        for i, (img_path, width, height, fit_mode) in enumerate(jobs):
+            signature = file_signature(img_path)
+            if signature is None:
+                results[i] = FileNotFoundError(img_path)
+                continue
+            if pool is not None:
+                # Checked before the metadata lookup so a pinned rotation never reads the store
+                tile = pool.get(TileCache.make_key(img_path, signature, width, height, fit_mode))
+                if tile is not None:
+                    results[i] = tile
+                    continue
+            meta = self.metadata.get(img_path, signature)
+            if meta is not None and not meta['ok']:
+                # Known to fail: don't spend a decode finding out again
+                results[i] = ValueError(f"unreadable image: {meta['error']}")
+                continue
+            key = TileCache.make_key(img_path, signature, width, height, fit_mode)
+            if key in missed_keys:
+                duplicates.append((i, missed_keys[key]))
+                continue
+            tile = self.tile_cache.get(key)
+            if tile is None:
+                missed_keys[key] = i
+                orientation = meta['orientation'] if meta else None
+                misses.append((i, key, (img_path, width, height, fit_mode, orientation)))
+            else:
+                results[i] = tile
+        
+        if misses:
+            timings = []
+            rendered = self.render_pool.render_many([job for _, _, job in misses], timings)
+            for (i, key, _), tile, job_timings in zip(misses, rendered, timings):
+                self.metrics.record_many(job_timings, monitors[i] if monitors else None)
+                if not isinstance(tile, Exception):
+                    self.tile_cache.put(key, tile)
+                results[i] = tile
+        for i, first in duplicates:
+            results[i] = results[first]
+        return results
+
+    def get_fit_mode(self, monitor_name):
+        """The monitor's fit mode (FIT_MODES); unknown or missing values fall back to cover."""
+        fit_mode = (self.configs.get(monitor_name) or {}).get('fit_mode', FIT_COVER)
+        return fit_mode if fit_mode in FIT_MODES else FIT_COVER
+
+    def set_fit_mode(self, monitor_name, fit_mode):
+        """Selects how the monitor's image fills it: 'cover', 'contain', 'stretch', 'center' or 'span'."""
+        if fit_mode not in FIT_MODES:
+            raise ValueError(f"Unknown fit mode: {fit_mode}")
+        self.update_config(monitor_name, 'fit_mode', fit_mode)
+
+    def set_span_bezel(self, pixels):
+        """Pixels hidden behind each monitor frame, skipped when an image spans monitors."""
+        self.update_app_settings('span_bezel_px', max(0, int(pixels)))
+        self._notify_config_changed(None, 'span_bezel_px')
+
+    def _fit_layout(self):
+        """Everything besides the images that decides the composite's pixels."""
+        return (
+            tuple((m['name'], m['rect'], self.get_fit_mode(m['name'])) for m in self.monitors),
+            self.get_app_settings().get('span_bezel_px', 0)
+        )
+
+    def plan_tiles(self, current_images_map, monitors=None):
+        """
+        Per monitor name: (image path, tile size, fit mode, region of the tile it shows).
+        Span monitors all show the first span image, cut out of one tile fitted to the
+        whole span group (span_layout), so it decodes and resamples once; the other
+        monitors show all of their own monitor-sized tile (region None).
+        monitors defaults to the current topology.
+        """
+        monitors = self.monitors if monitors is None else monitors
+        plans = {}
+        span = [m for m in monitors if self.get_fit_mode(m['name']) == FIT_SPAN]
+        if span:
+            size, offsets = span_layout(
+                tuple((m['name'], m['rect']) for m in span),
+                self.get_app_settings().get('span_bezel_px', 0)
+            )
+            img_path = next((current_images_map[m['name']] for m in span if current_images_map.get(m['name'])), None)
+            for m in span:
+                x, y = offsets[m['name']]
+                plans[m['name']] = (img_path, size, FIT_COVER, (x, y, x + m['width'], y + m['height']))
+        for m in monitors:
+            if m['name'] not in plans:
+                plans[m['name']] = (
+                    current_images_map.get(m['name']), (m['width'], m['height']), self.get_fit_mode(m['name']), None
+                )
+        return plans
+
     def generate_stitched_wallpaper(self, current_images_map):
         """
         Creates a stitched wallpaper.
         current_images_map: dict { "monitor_name": "path/to/image.jpg" }
         """
-        if not self.monitors:
+        with self._render_lock, self.metrics.tick('render'):
+            # detect_monitors swaps the list on the monitor-watch thread; one render uses one topology
+            return self._generate_stitched_wallpaper(current_images_map, self.monitors)
+
+    def _generate_stitched_wallpaper(self, current_images_map, monitors):
+        if not monitors:
             return None
 
         # Calculate bounding box of all monitors
-        min_x = min(m['x'] for m in self.monitors)
-        min_y = min(m['y'] for m in self.monitors)
-        max_x = max(m['rect'][2] for m in self.monitors)
-        max_y = max(m['rect'][3] for m in self.monitors)
+        min_x = min(m['x'] for m in monitors)
+        min_y = min(m['y'] for m in monitors)
+        max_x = max(m['rect'][2] for m in monitors)
+        max_y = max(m['rect'][3] for m in monitors)
         
         total_width = max_x - min_x
         total_height = max_y - min_y
         
-        canvas = Image.new('RGB', (total_width, total_height), (0, 0, 0))
+        # A composite larger than the band budget is streamed to disk band by band instead
+        band_mb = self.get_app_settings().get('render_band_mb', 0)
+        if band_mb and total_width * total_height * 3 > band_mb * 1024 * 1024:
+            return self._generate_banded_wallpaper(
+                current_images_map, monitors, min_x, min_y, total_width, total_height, band_mb * 1024 * 1024
+            )
         
-        for m in self.monitors:
-            img_path = current_images_map.get(m['name'])
+        # Reuse the composite from the previous tick; only a change of the desktop bounds reallocates it
+        layout = tuple((m['name'], m['rect']) for m in monitors)
+        compositor = self.get_app_settings().get('compositor', COMPOSITOR_PIL)
+        if (self._canvas is None or self._canvas.size != (total_width, total_height)
+                or self._canvas_origin != (min_x, min_y) or self._canvas_compositor != compositor):
+            self._canvas = create_canvas((total_width, total_height), compositor)
+            self._canvas_layout = layout
+            self._canvas_origin = (min_x, min_y)
+            self._canvas_compositor = compositor
+            self._canvas_images = {}
+            self._dirty_monitors = {m['name'] for m in monitors}
+        elif self._canvas_layout != layout:
+            self._repaint_changed_regions(layout, min_x, min_y)
+        canvas = self._canvas
+        
+        # Work out which regions need repainting first, so their tiles can render in parallel
+        plans = self.plan_tiles(current_images_map, monitors)
+        pending = []
+        for m in monitors:
+            img_path, size, fit_mode, region = plans[m['name']]
+            signature = file_signature(img_path) if img_path else None
+            painted = (img_path, signature, size, fit_mode, region) if signature else None
             
+            if m['name'] not in self._dirty_monitors and self._canvas_images.get(m['name']) == painted:
+                continue
+            pending.append((m, painted))
+        
+        # Span monitors share a job; get_tiles renders it once
+        tiles = self.get_tiles(
+            [(painted[0], *painted[2], painted[3]) for m, painted in pending if painted],
+            [m['name'] for m, painted in pending if painted]
+        )
+        
+        for m, painted in pending:
             # Helper to paste image correctly
             paste_x = m['x'] - min_x
             paste_y = m['y'] - min_y
             
-            if img_path and os.path.exists(img_path):
-                try:
-                    img = Image.open(img_path)
-                    # Resize/Crop to fill monitor
-                    
-                    # Calculate target aspect ratio
-                    target_ratio = m['width'] / m['height']
-                    img_ratio = img.width / img.height
-                    
-                    if img_ratio > target_ratio:
-                        # Image is wider, crop sides
-                        new_height = m['height']
-                        new_width = int(new_height * img_ratio)
-                    else:
-                        # Image is taller, crop top/bottom
-                        new_width = m['width']
-                        new_height = int(new_width / img_ratio)
-                        
-                    img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                    
-                    # Center crop
-                    left = (new_width - m['width']) / 2
-                    top = (new_height - m['height']) / 2
-                    right = (new_width + m['width']) / 2
-                    bottom = (new_height + m['height']) / 2
-                    
-                    img = img.crop((left, top, right, bottom))
-                    
-                    canvas.paste(img, (paste_x, paste_y))
-                except Exception as e:
-                    self._log(f"Error processing image {img_path}: {e}")
+            if painted:
+                img = tiles.pop(0)
+                if isinstance(img, Exception):
+                    self._log(f"Error processing image {painted[0]}: {img}")
+                    canvas.clear((paste_x, paste_y, paste_x + m['width'], paste_y + m['height']))
+                    painted = None
+                else:
+                    with self.metrics.timer('paste', m['name']):
+                        canvas.paste(img.crop(painted[4]) if painted[4] else img, (paste_x, paste_y))
             else:
-                # If no image or invalid, maybe paste a placeholder or just leave black
-                pass
+                # No image or invalid: clear whatever the previous tick left in this region
+                canvas.clear((paste_x, paste_y, paste_x + m['width'], paste_y + m['height']))
+            
+            self._canvas_images[m['name']] = painted
+            self._dirty_monitors.discard(m['name'])
                 
-        output_path = os.path.join(tempfile.gettempdir(), "stitched_wallpaper.png")
+        image = canvas.image()
+        fmt = self.resolve_output_format(image, painted=any(self._canvas_images.values()))
+        base_path = self._next_output_base()
+        output_path = output_path_for(fmt, base_path)
         try:
-             canvas.save(output_path, "PNG")
+             elapsed = encode_wallpaper(image, output_path, fmt, self.get_app_settings())
+             self.metrics.record('encode', elapsed)
+             logger.debug(f"Encoded stitched wallpaper as {fmt} in {elapsed:.3f}s, peak RSS {peak_rss_kb()} KiB")
+             remove_stale_outputs(base_path, output_path)
              return output_path
         except Exception as e:
             self._log(f"Error saving stitched wallpaper: {e}")
             return None
 
-    def set_system_wallpaper(self, path):
-        if not path or not os.path.exists(path):
-            return
-            
-        abs_path = os.path.abspath(path)
-        # 1. Set wallpaper style to Tile (Tiled) which is required for span connection
-        # Registry: HKEY_CURRENT_USER\Control Panel\Desktop -> WallpaperStyle=0, TileWallpaper=1
+    def _next_output_base(self):
+        """Output path (without extension) of the next slot the apply worker doesn't still need."""
+        busy = {os.path.splitext(path)[0] for path in self.applier.busy_paths()}
+        for _ in range(OUTPUT_SLOTS):
+            self._output_slot = (self._output_slot + 1) % OUTPUT_SLOTS
+            base_path = os.path.join(tempfile.gettempdir(), f"stitched_wallpaper_{self._output_slot}")
+            if base_path not in busy:
+                break
+        return base_path
+
+    def _repaint_changed_regions(self, layout, min_x, min_y):
+        """Same desktop bounds, different monitors: clear the regions that went away, repaint what moved."""
+        old = dict(self._canvas_layout)
+        new = dict(layout)
+        cleared = []
+        for name, rect in old.items():
+            if new.get(name) != rect:
+                region = (rect[0] - min_x, rect[1] - min_y, rect[2] - min_x, rect[3] - min_y)
+                self._canvas.clear(region)
+                self._canvas_images.pop(name, None)
+                cleared.append(rect)
+        for name, rect in new.items():
+            # Moved or new monitors, and any whose pixels a cleared (e.g. mirrored) region overlapped
+            overlaps = any(rect[0] < c[2] and c[0] < rect[2] and rect[1] < c[3] and c[1] < rect[3] for c in cleared)
+            if old.get(name) != rect or overlaps:
+                self._dirty_monitors.add(name)
+        self._canvas_layout = layout
+
+    def _generate_banded_wallpaper(self, current_images_map, monitors, min_x, min_y, total_width, total_height, band_bytes):
+        """
+        Render without a full-size canvas: one band of rows at a time, of at most
+        band_bytes, written straight into a BMP. Tiles are fetched when the first band
+        reaches their monitor and dropped after its last row, so besides the band only
+        one row of monitors' tiles is held (plus what the tile cache keeps). Rows between
+        vertically offset monitors are never allocated. Always outputs BMP, the one
+        format that can be written in bands.
+        """
+        # The persistent canvas is exactly what this mode avoids keeping around
+        self._canvas = None
+        self._canvas_layout = None
+        self._canvas_origin = None
+        self._canvas_compositor = None
+        self._canvas_images = {}
+        self._dirty_monitors.clear()
+        
+        plans = self.plan_tiles(current_images_map, monitors)
+        placed = [(m, plans[m['name']]) for m in monitors if plans[m['name']][0]]
+        regions = [(m['x'] - min_x, m['y'] - min_y, m['width'], m['height']) for m, _ in placed]
+
+        def fetch(indexes):
+            jobs = [placed[i] for i in indexes]
+            tiles = self.get_tiles(
+                [(path, *size, fit_mode) for _, (path, size, fit_mode, _) in jobs],
+                [m['name'] for m, _ in jobs]
+            )
+            fetched = {}
+            for i, (m, (path, _, _, region)), tile in zip(indexes, jobs, tiles):
+                if isinstance(tile, Exception):
+                    self._log(f"Error processing image {path}: {tile}")
+                    continue
+                fetched[i] = tile.crop(region) if region else tile
+            return fetched
+        
+        # The band and its BGR copy for the file both count against the budget
+        band_rows = max(1, min(total_height, band_bytes // (2 * bmp_row_stride(total_width))))
+        base_path = self._next_output_base()
+        output_path = output_path_for(FORMAT_BMP, base_path)
         try:
-            import winreg
-            key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, "Control Panel\\Desktop", 0, winreg.KEY_SET_VALUE)
-            winreg.SetValueEx(key, "WallpaperStyle", 0, winreg.REG_SZ, "0")
-            winreg.SetValueEx(key, "TileWallpaper", 0, winreg.REG_SZ, "1")
-            winreg.CloseKey(key)
+            start = time.perf_counter()
+            timings = {}
+            bands = write_bmp_bands(output_path, total_width, total_height, regions, fetch, band_rows, timings)
+            self.metrics.record_many(timings)
+            logger.info(
+                f"Banded render {total_width}x{total_height}: {bands} bands of {band_rows} rows "
+                f"in {time.perf_counter() - start:.3f}s, peak RSS {peak_rss_kb()} KiB"
+            )
+            remove_stale_outputs(base_path, output_path)
+            return output_path
         except Exception as e:
-            self._log(f"Registry Set Error: {e}")
+            self._log(f"Error saving stitched wallpaper: {e}")
+            return None
+
+    def prerender_wallpaper(self, images_map):
+        """Renders the next composite on a background thread ahead of its deadline."""
+        images_map = dict(images_map)
+        if self._prerendered and self._prerendered[0] == images_map:
+            return
+        if self._prerender_thread and self._prerender_thread.is_alive():
+            # One look-ahead at a time; the next tick schedules a new one if this goes stale
+            return
+        self._prerender_thread = threading.Thread(target=self._run_prerender, args=(images_map,), daemon=True)
+        self._prerender_thread.start()
+
+    def _run_prerender(self, images_map):
+        signatures = {name: file_signature(path) for name, path in images_map.items() if path}
+        fit_layout = self._fit_layout()
+        with self.metrics.tick('prerender'):
+            path = self.generate_stitched_wallpaper(images_map)
+        if path:
+            self._prerendered = (images_map, signatures, path, fit_layout)
+
+    def take_prerendered(self, images_map):
+        """Returns the pre-rendered file for images_map, or None if it is missing or stale."""
+        thread = self._prerender_thread
+        if thread and thread.is_alive():
+            # Already in flight and ahead of us; waiting is cheaper than rendering twice
+            thread.join()
+
+        prerendered = self._prerendered
+        self._prerendered = None
+        if not prerendered or prerendered[0] != dict(images_map):
+            return None
+        _, signatures, path, fit_layout = prerendered
+        if fit_layout != self._fit_layout():
+            # Fit modes, bezel or monitors changed since; the composite is laid out wrong
+            return None
+        for name, path_ in images_map.items():
+            if path_ and file_signature(path_) != signatures.get(name):
+                return None
+        return path if os.path.exists(path) else None
+
+    def set_pinned_pool(self, enabled, budget_mb=None):
+        """
+        Keeps the fitted tiles of every enabled monitor's playlist in memory, up to
+        budget_mb (app setting 'pinned_pool_mb', default 512), warmed in the background.
+        Meant for short intervals over small playlists; disabling frees the tiles.
+        """
+        app_settings = self.configs.setdefault('app_settings', {})
+        if budget_mb is not None:
+            app_settings['pinned_pool_mb'] = int(budget_mb)
+        if app_settings.get('pinned_pool', False) != enabled:
+            self.update_app_settings('pinned_pool', enabled)
+        if not enabled:
+            pool, self.pinned_pool = self.pinned_pool, None
+            if pool is not None:
+                pool.clear()
+                self._log("Pinned tile pool disabled")
+            return
+        max_bytes = app_settings.get('pinned_pool_mb', 512) * 1024 * 1024
+        if self.pinned_pool is None:
+            self.pinned_pool = PinnedTilePool(max_bytes)
+        else:
+            self.pinned_pool.max_bytes = max_bytes
+        self.warm_pinned_pool()
+
+    def warm_pinned_pool(self):
+        """Brings the pinned pool up to date with the playlists on a background thread."""
+        if self.pinned_pool is None:
+            return
+        with self._pool_lock:
+            if self._pool_thread and self._pool_thread.is_alive():
+                # The running pass starts over once it is done
+                self._pool_rewarm = True
+                return
+            self._pool_rewarm = False
+            self._pool_thread = threading.Thread(target=self._run_pool_warm, daemon=True, name="pinned-pool")
+            self._pool_thread.start()
+
+    def _run_pool_warm(self):
+        while True:
+            try:
+                self._warm_pinned_pool()
+            except Exception as e:
+                logger.error(f"Pinned pool warm error: {e}")
+            with self._pool_lock:
+                if not self._pool_rewarm or self.pinned_pool is None:
+                    self._pool_thread = None
+                    return
+                self._pool_rewarm = False
+
+    def _warm_pinned_pool(self):
+        pool = self.pinned_pool
+        if pool is None:
+            return
+        start = time.perf_counter()
+        # Every enabled monitor's playlist in the order it will be shown, interleaved so
+        # the tiles needed soonest are pinned first if the budget runs out
+        plans = self.plan_tiles({})
+        queues = []
+        for m in self.monitors:
+            cfg = self.configs.get(m['name']) or {}
+            if not cfg.get('enabled'):
+                continue
+            images = self.get_playlist(m['name'])
+            _, size, fit_mode, _ = plans[m['name']]
+            queues.append([(path, *size, fit_mode)
+                           for _, path in walk_playlist(images, playlist_cursor(images, cfg))])
+        wanted = {}
+        for jobs in itertools.zip_longest(*queues):
+            for job in jobs:
+                if job is None:
+                    continue
+                signature = file_signature(job[0])
+                meta = self.metadata.get(job[0], signature) if signature else None
+                if signature is None or (meta is not None and not meta['ok']):
+                    continue
+                key = TileCache.make_key(job[0], signature, *job[1:])
+                if key not in wanted:
+                    wanted[key] = job + ((meta['orientation'] if meta else None),)
+        pool.retain(wanted)
+
+        batch_size = max(4, 2 * self.render_pool.workers)
+        missing = [(key, job) for key, job in wanted.items() if key not in pool]
+        full = False
+        for offset in range(0, len(missing), batch_size):
+            if self.pinned_pool is not pool:
+                return
+            batch = []
+            reserved = 0
+            for key, job in missing[offset:offset + batch_size]:
+                reserved += job[1] * job[2] * 3
+                if reserved > pool.free_bytes:
+                    full = True
+                    break
+                batch.append((key, job))
+            tiles = self.render_pool.render_many([job for _, job in batch]) if batch else []
+            for (key, _), tile in zip(batch, tiles):
+                if not isinstance(tile, Exception) and not pool.pin(key, tile):
+                    full = True
+            if full:
+                break
+        
+        stats = pool.stats()
+        self._log(
+            f"Pinned tile pool: {stats['tiles']}/{len(wanted)} playlist tiles, "
+            f"{stats['bytes'] / (1024 * 1024):.0f}/{pool.max_bytes // (1024 * 1024)} MiB "
+            f"({stats['fill_ratio']:.0%} full{', budget reached' if full else ''}) "
+            f"in {time.perf_counter() - start:.1f}s, hit rate {stats['hit_ratio']:.0%}"
+        )
+
+    def _on_pool_config_changed(self, monitor_name, key):
+        if key in PINNED_POOL_KEYS:
+            self.warm_pinned_pool()
+
+    def get_stats(self):
+        """Pipeline timings (rolling summaries, histograms, recent ticks), cache hit ratios and peak memory."""
+        stats = self.metrics.snapshot()
+        stats['tile_cache'] = self.tile_cache.stats()
+        if self.pinned_pool is not None:
+            stats['pinned_pool'] = self.pinned_pool.stats()
+        stats['apply_queue'] = self.applier.stats()
+        stats['render_workers'] = self.render_pool.workers if self.render_pool.parallel else 1
+        stats['peak_rss_kb'] = peak_rss_kb()
+        return stats
+
+    def dump_stats(self, path=None):
+        """Writes get_stats() as JSON (next to the config by default). Returns the path."""
+        path = path or os.path.splitext(self.config_file)[0] + "_stats.json"
+        dump_json(self.get_stats(), path)
+        return path
+
+    def set_system_wallpaper(self, path, wait=False):
+        """
+        Queues the composite for the apply worker and returns at once; a composite
+        still waiting from before is dropped. wait=True blocks until it is applied.
+        """
+        if not path or not os.path.exists(path):
+            return
+        self.applier.submit(os.path.abspath(path))
+        if wait:
+            self.applier.wait_idle()
+
+    def _apply_system_wallpaper(self, path):
+        if self.backend.set_wallpaper(path):
+            self._log(f"Wallpaper updated.")
+            return True
+        self._log(f"Wallpaper could not be applied.")
+        return False
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service(backend=None):
+    """
+    The shared WallpaperService, created on first use (backend only applies then).
+    Nothing is constructed at import, so render pool workers and tools that import
+    this module don't detect monitors or open the library.
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = WallpaperService(backend)
+        return _service
 
-        # 2. Call API
-        user32.SystemParametersInfoW(SPI_SETDESKWALLPAPER, 0, abs_path, SPIF_UPDATEINIFILE | SPIF_SENDCHANGE)
-        self._log(f"Wallpaper updated.")
 
-# Singleton Instance
-service = WallpaperService()
+def __getattr__(name):
+    # `from wallpaper_service import service` keeps working, lazily
+    if name == "service":
+        return get_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")